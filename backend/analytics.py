@@ -0,0 +1,138 @@
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional
+
+from game_logic import OPERATIONS
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def round_columns_pipeline(player_id: str) -> list:
+    """
+    Aggregation that flattens every answered round of a player into four
+    parallel arrays, so the statistics are one columnar NumPy pass. It reads
+    both stored layouts: rounds_data sub-documents (version 1) and the arrays
+    under "r" (version 2), zipped by index. Packed sessions ("b") are binary
+    and left to the caller.
+    """
+    index = {"$range": [0, {"$size": "$r.o"}]}
+    return [
+        {"$match": {"player_id": player_id, "b": {"$exists": False}}},
+        {"$project": {"_id": 0, "rounds": {"$cond": [
+            {"$eq": ["$v", 2]},
+            {"$map": {"input": index, "as": "i", "in": {
+                "operation": {"$arrayElemAt": ["$r.o", "$$i"]},
+                "round_number": {"$add": ["$$i", 1]},
+                "is_correct": {"$ifNull": [{"$arrayElemAt": ["$r.k", "$$i"]}, None]},
+                # Stored in milliseconds
+                "time_taken": {"$divide": [{"$arrayElemAt": ["$r.t", "$$i"]}, 1000]},
+            }}},
+            {"$map": {"input": {"$ifNull": ["$rounds_data", []]}, "as": "round", "in": {
+                # Operation as its index in OPERATIONS, -1 if unknown
+                "operation": {"$indexOfArray": [OPERATIONS, "$$round.operation"]},
+                "round_number": "$$round.round_number",
+                "is_correct": {"$ifNull": ["$$round.is_correct", None]},
+                "time_taken": "$$round.time_taken",
+            }}},
+        ]}}},
+        {"$unwind": "$rounds"},
+        {"$match": {"rounds.is_correct": {"$ne": None}}},
+        {"$group": {
+            "_id": None,
+            "operation": {"$push": "$rounds.operation"},
+            "round_number": {"$push": "$rounds.round_number"},
+            "is_correct": {"$push": "$rounds.is_correct"},
+            "time_taken": {"$push": {"$ifNull": ["$rounds.time_taken", None]}},
+        }},
+    ]
+
+
+def _breakdown(key: str, is_correct: "np.ndarray", time_taken: "np.ndarray") -> dict:
+    import numpy as np
+
+    times = time_taken[~np.isnan(time_taken)]
+    p50, p90, p99 = np.percentile(times, [50, 90, 99]) if times.size else (0.0, 0.0, 0.0)
+    return {
+        "key": key,
+        "attempts": int(is_correct.size),
+        "accuracy": round(float(is_correct.mean()), 4),
+        "latency_p50": round(float(p50), 3),
+        "latency_p90": round(float(p90), 3),
+        "latency_p99": round(float(p99), 3),
+    }
+
+
+def calculate_player_analytics(player_id: str, columns: Optional[dict]) -> dict:
+    """Accuracy and time_taken percentiles per operation and per round"""
+    # NumPy is only loaded once analytics are first asked for
+    import numpy as np
+
+    columns = columns or {}
+    operations = np.array(columns.get("operation", []), dtype=np.int8)
+    round_numbers = np.array(columns.get("round_number", []), dtype=np.int64)
+    is_correct = np.array(columns.get("is_correct", []), dtype=bool)
+    # None (no time recorded) becomes NaN
+    time_taken = np.array(columns.get("time_taken", []), dtype=np.float64)
+
+    by_operation = []
+    for code, operation in enumerate(OPERATIONS):
+        mask = operations == code
+        if mask.any():
+            by_operation.append(_breakdown(operation, is_correct[mask], time_taken[mask]))
+
+    by_round = []
+    for round_number in range(1, 11):
+        mask = round_numbers == round_number
+        if mask.any():
+            by_round.append(_breakdown(str(round_number), is_correct[mask], time_taken[mask]))
+
+    return {
+        "player_id": player_id,
+        "rounds_played": int(is_correct.size),
+        "by_operation": by_operation,
+        "by_round": by_round,
+    }
+
+
+class AnalyticsCache:
+    """
+    Computed analytics per player, dropped when the player finishes a game.
+    Every invalidation bumps the generation of the player, so analytics
+    computed from rounds read before a completion are not cached after it.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        # player_id -> counter at its last invalidation, bounded like the entries;
+        # players evicted from it take the highest evicted generation instead
+        self._generations: "OrderedDict[str, int]" = OrderedDict()
+        self._counter = 0
+        self._evicted_generation = 0
+
+    def generation(self, player_id: str) -> int:
+        return self._generations.get(player_id, self._evicted_generation)
+
+    def get(self, player_id: str) -> Optional[dict]:
+        analytics = self._entries.get(player_id)
+        if analytics is not None:
+            self._entries.move_to_end(player_id)
+        return analytics
+
+    def put(self, player_id: str, analytics: dict, generation: Optional[int] = None) -> None:
+        """generation as read before the analytics were computed, they are dropped if it has changed"""
+        if generation is not None and generation != self.generation(player_id):
+            return
+        self._entries[player_id] = analytics
+        self._entries.move_to_end(player_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, player_id: str) -> None:
+        self._entries.pop(player_id, None)
+        self._counter += 1
+        self._generations[player_id] = self._counter
+        self._generations.move_to_end(player_id)
+        while len(self._generations) > self.max_entries:
+            _, generation = self._generations.popitem(last=False)
+            self._evicted_generation = max(self._evicted_generation, generation)
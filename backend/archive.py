@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import math
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional
+
+import bson
+from bson import Binary
+
+from session_codec import append_round_columns, decode_session, empty_round_columns
+
+
+def compress_sessions(documents: List[dict]) -> bytes:
+    return zlib.compress(bson.encode({"sessions": documents}), 6)
+
+
+def decompress_sessions(data: bytes) -> List[dict]:
+    return bson.decode(zlib.decompress(data))["sessions"]
+
+
+def _float64_bytes(values: List[Optional[float]]) -> bytes:
+    """Little-endian doubles, NaN for a missing value"""
+    packed = array("d", [math.nan if value is None else value for value in values])
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _float64_list(data: bytes) -> List[float]:
+    unpacked = array("d", data)
+    if sys.byteorder == "big":
+        unpacked.byteswap()
+    return unpacked.tolist()
+
+
+def player_round_columns(documents: List[dict]) -> List[dict]:
+    """
+    The analytics columns of every player in a chunk as small binary arrays,
+    stored next to the compressed sessions so that analytics reads them
+    without decompressing anything: operation (int8), round number (int8),
+    is_correct (one byte each) and time_taken (float64, NaN when missing)
+    """
+    columns_by_player: Dict[str, dict] = {}
+    for document in documents:
+        append_round_columns(columns_by_player.setdefault(document["player_id"], empty_round_columns()), document)
+    return [
+        {
+            "player_id": player_id,
+            "o": Binary(array("b", columns["operation"]).tobytes()),
+            "n": Binary(array("b", columns["round_number"]).tobytes()),
+            "k": Binary(bytes(columns["is_correct"])),
+            "t": Binary(_float64_bytes(columns["time_taken"])),
+        }
+        for player_id, columns in columns_by_player.items()
+    ]
+
+
+def extend_round_columns(columns: dict, player_columns: dict) -> None:
+    columns["operation"].extend(array("b", player_columns["o"]).tolist())
+    columns["round_number"].extend(array("b", player_columns["n"]).tolist())
+    columns["is_correct"].extend(bool(value) for value in player_columns["k"])
+    columns["time_taken"].extend(_float64_list(player_columns["t"]))
+
+
+def _chunk_round_columns(data: bytes, player_id: str) -> dict:
+    """Columns of one player decoded from the sessions of a chunk"""
+    columns = empty_round_columns()
+    for document in decompress_sessions(data):
+        if document["player_id"] == player_id:
+            append_round_columns(columns, document)
+    return columns
+
+
+def _find_session(data: bytes, session_id: str) -> Optional[dict]:
+    for document in decompress_sessions(data):
+        if document["session_id"] == session_id:
+            return document
+    return None
+
+
+class SessionArchive:
+    """
+    Cold tier for completed game sessions. Sessions completed more than
+    after_days ago are moved, batch_size at a time, from db.game_sessions into
+    zlib-compressed chunks in db.game_sessions_archive. Each chunk lists its
+    session and player ids, whose multikey indexes are the lookup path for
+    archived sessions, and carries the analytics columns of each player.
+    Player statistics live in db.players and are untouched.
+    """
+
+    def __init__(self, db, after_days: float = 30.0, batch_size: int = 500, interval: float = 3600.0):
+        self.sessions = db.game_sessions
+        self.chunks = db.game_sessions_archive
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"archived": 0, "chunks": 0}
+
+    async def archive_batch(self, now: Optional[datetime] = None) -> int:
+        """Archive up to batch_size sessions, returns how many were moved"""
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.after_days)
+        documents = await self.sessions.find(
+            {"is_completed": True, "completed_at": {"$lt": cutoff}}
+        ).sort("completed_at", 1).limit(self.batch_size).to_list(self.batch_size)
+        if not documents:
+            return 0
+
+        ids = [document.pop("_id") for document in documents]
+        # Compression is CPU-bound, keep it off the event loop
+        data, round_columns = await asyncio.to_thread(
+            lambda: (compress_sessions(documents), player_round_columns(documents))
+        )
+        # The chunk is written before the sessions are deleted, so a failure in
+        # between leaves a duplicate (the hot copy wins on reads) rather than a loss
+        await self.chunks.insert_one({
+            "session_ids": [document["session_id"] for document in documents],
+            "player_ids": sorted({document["player_id"] for document in documents}),
+            "completed_from": documents[0]["completed_at"],
+            "completed_to": documents[-1]["completed_at"],
+            "count": len(documents),
+            "round_columns": round_columns,
+            "data": Binary(data),
+        })
+        await self.sessions.delete_many({"_id": {"$in": ids}, "is_completed": True})
+        self.stats["archived"] += len(documents)
+        self.stats["chunks"] += 1
+        return len(documents)
+
+    async def archive(self, now: Optional[datetime] = None) -> int:
+        """Archive every eligible session, one batch in memory at a time"""
+        archived = 0
+        while True:
+            moved = await self.archive_batch(now)
+            archived += moved
+            if moved < self.batch_size:
+                return archived
+            await asyncio.sleep(0)
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        chunk = await self.chunks.find_one({"session_ids": session_id}, {"_id": 0, "data": 1})
+        if chunk is None:
+            return None
+        return decode_session(await asyncio.to_thread(_find_session, chunk["data"], session_id))
+
+    async def completed_sessions(self, since: Optional[datetime], until: datetime) -> AsyncIterator[dict]:
+        """Archived sessions completed in (since, until], one chunk in memory at a time"""
+        query = {"completed_from": {"$lte": until}}
+        if since is not None:
+            query["completed_to"] = {"$gt": since}
+        async for chunk in self.chunks.find(query, {"_id": 0, "data": 1}).sort("completed_from", 1):
+            for document in await asyncio.to_thread(decompress_sessions, chunk["data"]):
+                if document["completed_at"] <= until and (since is None or document["completed_at"] > since):
+                    yield decode_session(document)
+
+    async def append_round_columns(self, columns: dict, player_id: str) -> None:
+        async for chunk in self.chunks.find(
+            {"player_ids": player_id, "round_columns": {"$exists": True}},
+            {"_id": 0, "round_columns": {"$elemMatch": {"player_id": player_id}}}
+        ):
+            for player_columns in chunk.get("round_columns", []):
+                extend_round_columns(columns, player_columns)
+        # Chunks archived before they carried the columns
+        async for chunk in self.chunks.find(
+            {"player_ids": player_id, "round_columns": {"$exists": False}}, {"_id": 0, "data": 1}
+        ):
+            chunk_columns = await asyncio.to_thread(_chunk_round_columns, chunk["data"], player_id)
+            for name, values in chunk_columns.items():
+                columns[name].extend(values)
+
+    async def _archive_periodically(self) -> None:
+        while True:
+            try:
+                archived = await self.archive()
+                if archived:
+                    logging.info(f"Archived {archived} completed game sessions")
+            except Exception as e:
+                logging.error(f"Error archiving game sessions: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._archive_periodically())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+from storage import PlayerStore
+
+
+class CacheSync:
+    """
+    Keeps the in-process caches of one worker in step with the writes of the
+    other workers. The players' created_at and last_played act as version
+    stamps: every interval the players changed since the previous poll are read
+    and handed to the subscribers, which refresh their entries from them.
+    Polls overlap by `overlap` seconds to cover clock skew between workers and
+    writes still in flight, so subscribers must be idempotent; they also see
+    the changes made by their own worker.
+    """
+
+    def __init__(self, store: PlayerStore, interval: float = 1.0, overlap: float = 5.0):
+        self.store = store
+        self.interval = interval
+        self.overlap = timedelta(seconds=overlap)
+        self._subscribers: List[Callable[[List[dict]], Awaitable[None]]] = []
+        self._since: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"polls": 0, "changed_players": 0}
+
+    def subscribe(self, callback: Callable[[List[dict]], Awaitable[None]]) -> None:
+        self._subscribers.append(callback)
+
+    async def poll(self, now: Optional[datetime] = None) -> int:
+        """Hand the players changed since the last poll to the subscribers, returns how many"""
+        now = now or datetime.utcnow()
+        since, self._since = self._since or now, now
+        players = await self.store.changed_since(since - self.overlap)
+        if players:
+            for callback in self._subscribers:
+                await callback(players)
+        self.stats["polls"] += 1
+        self.stats["changed_players"] += len(players)
+        return len(players)
+
+    async def _poll_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                logging.error(f"Error syncing caches: {str(e)}")
+
+    def start(self) -> None:
+        if self._task is None:
+            # Everything before startup was loaded from the store already
+            self._since = datetime.utcnow()
+            self._task = asyncio.create_task(self._poll_periodically())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
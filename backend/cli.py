@@ -0,0 +1,842 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+from datetime import datetime
+from typing import List, Optional
+
+import typer
+from dotenv import load_dotenv
+from pymongo import ReplaceOne, monitoring
+
+from connection import create_client
+from indexes import ensure_indexes, explain_api_queries
+from session_cache import WRITE_THROUGH, WRITE_BEHIND
+from session_codec import decode_session, encode_session
+from storage import create_stores
+
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+app = typer.Typer(help="Maintenance and diagnostic commands for the game backend")
+
+
+def get_db():
+    client = create_client()
+    return client, client[os.environ['DB_NAME']]
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts database round-trips issued through a client"""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def format_latency(values: List[float]) -> str:
+    return f"p50 {percentile(values, 50) * 1000:.2f}ms  p99 {percentile(values, 99) * 1000:.2f}ms"
+
+
+@app.command("explain-queries")
+def explain_queries(
+    create_indexes: bool = typer.Option(True, help="Create missing indexes before explaining")
+):
+    """Run explain() on every query the API issues and fail on any COLLSCAN"""
+    async def run():
+        client, db = get_db()
+        try:
+            if create_indexes:
+                await ensure_indexes(db)
+            return await explain_api_queries(db)
+        finally:
+            client.close()
+
+    collection_scans = 0
+    for collection, query, stages in asyncio.run(run()):
+        is_collscan = "COLLSCAN" in stages
+        collection_scans += is_collscan
+        status = "❌ COLLSCAN" if is_collscan else "✅"
+        typer.echo(f"{status} {collection} {query}: {' <- '.join(stages)}")
+
+    if collection_scans:
+        typer.echo(f"{collection_scans} queries scan a whole collection")
+        raise typer.Exit(code=1)
+
+
+@app.command("replay")
+def replay(session_id: str):
+    """Print every round of a seeded game session as it was played"""
+    from game_logic import question_for_round
+
+    async def run():
+        client, db = get_db()
+        try:
+            return decode_session(await db.game_sessions.find_one({"session_id": session_id}))
+        finally:
+            client.close()
+
+    game_session = asyncio.run(run())
+    if not game_session:
+        typer.echo(f"Game session {session_id} not found")
+        raise typer.Exit(code=1)
+    if game_session.get("seed") is None:
+        typer.echo(f"Game session {session_id} has no seed, its questions cannot be replayed")
+        raise typer.Exit(code=1)
+
+    answers = {round_data["round_number"]: round_data for round_data in game_session["rounds_data"]}
+    typer.echo(f"Session {session_id} seed {game_session['seed']} score {game_session['score']}")
+    for round_number in range(1, 11):
+        question, correct_answer, options, _ = question_for_round(game_session["seed"], round_number)
+        answer = answers.get(round_number, {})
+        typer.echo(f"round {round_number:>2}: {question} = {correct_answer} options {options} "
+                   f"answered {answer.get('player_answer')} in {answer.get('time_taken')}s")
+
+
+@app.command("migrate-sessions")
+def migrate_sessions(
+    batch_size: int = typer.Option(1000, help="Sessions read and rewritten per batch"),
+    pack_completed: bool = typer.Option(False, help="Also pack the rounds of completed sessions into a binary blob")
+):
+    """Rewrite game sessions in the compact storage layout"""
+    async def run():
+        client, db = get_db()
+        query = {"v": {"$exists": False}}
+        if pack_completed:
+            query = {"$or": [query, {"is_completed": True, "b": {"$exists": False}}]}
+        migrated = skipped = unconverted = 0
+        last_id = None
+        try:
+            while True:
+                batch_query = {**query, "_id": {"$gt": last_id}} if last_id is not None else query
+                batch = await db.game_sessions.find(batch_query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+                if not batch:
+                    return migrated, skipped, unconverted
+                last_id = batch[-1]["_id"]
+                replacements = []
+                for document in batch:
+                    # Sessions stored before answers were bounded may hold values
+                    # the compact layout cannot, they keep the layout they have
+                    try:
+                        encoded = encode_session(decode_session(document), pack=pack_completed)
+                    except ValueError as e:
+                        typer.echo(f"Session {document['session_id']} left as it is: {e}")
+                        unconverted += 1
+                        continue
+                    if "v" in document and "b" not in encoded:
+                        unconverted += 1
+                        continue
+                    # Sessions answered since they were read no longer match and are
+                    # left for the next run
+                    replacements.append(ReplaceOne(
+                        {"_id": document["_id"], "current_round": document["current_round"],
+                         "is_completed": document["is_completed"]},
+                        encoded
+                    ))
+                if replacements:
+                    result = await db.game_sessions.bulk_write(replacements, ordered=False)
+                    migrated += result.modified_count
+                    skipped += len(replacements) - result.modified_count
+                typer.echo(f"{migrated} sessions migrated")
+        finally:
+            client.close()
+
+    migrated, skipped, unconverted = asyncio.run(run())
+    typer.echo(f"Done: {migrated} sessions migrated, {skipped} changed while migrating, "
+               f"{unconverted} left with values out of range")
+
+
+@app.command("archive-sessions")
+def archive_sessions(
+    days: float = typer.Option(30.0, help="Archive sessions completed more than this many days ago"),
+    batch_size: int = typer.Option(500, help="Sessions per compressed archive chunk")
+):
+    """Move old completed game sessions to the compressed archive once"""
+    from archive import SessionArchive
+
+    async def run():
+        client, db = get_db()
+        try:
+            await ensure_indexes(db)
+            session_archive = SessionArchive(db, after_days=days, batch_size=batch_size)
+            archived = await session_archive.archive()
+            return archived, session_archive.stats["chunks"]
+        finally:
+            client.close()
+
+    archived, chunks = asyncio.run(run())
+    typer.echo(f"Archived {archived} sessions in {chunks} chunks")
+
+
+@app.command("export-sessions")
+def export_sessions_command(
+    output: Path = typer.Argument(..., help="File to write"),
+    export_format: str = typer.Option("ndjson", "--format", help="ndjson, csv or parquet (needs pyarrow)"),
+    since: Optional[datetime] = typer.Option(None, help="Only sessions completed after this time (UTC)"),
+    watermark_file: Optional[Path] = typer.Option(
+        None, help="Read since from this file when not given, and store the new watermark in it"
+    ),
+    batch_size: int = typer.Option(1000, help="Sessions per cursor batch")
+):
+    """Stream completed game sessions with their rounds to a file"""
+    from export import FORMATS, export_sessions, export_window, parquet_available
+
+    if export_format not in FORMATS:
+        typer.echo(f"Unknown export format {export_format}, use one of {', '.join(FORMATS)}")
+        raise typer.Exit(code=1)
+    if export_format == "parquet" and not parquet_available():
+        typer.echo("Parquet export requires pyarrow")
+        raise typer.Exit(code=1)
+    if since is None and watermark_file and watermark_file.exists():
+        since = datetime.fromisoformat(watermark_file.read_text().strip())
+    until = export_window(since)
+
+    async def run():
+        client, db = get_db()
+        written = 0
+        try:
+            stores = create_stores("mongo", db)
+            with open(output, "wb") as file:
+                async for chunk in export_sessions(stores.games, export_format, since, until, batch_size):
+                    file.write(chunk)
+                    written += len(chunk)
+            return written
+        finally:
+            client.close()
+
+    written = asyncio.run(run())
+    # Only advanced once the export is complete, a failed run is simply repeated
+    if watermark_file:
+        watermark_file.write_text(until.isoformat())
+    typer.echo(f"Exported sessions completed in ({since}, {until}] to {output} ({written} bytes)")
+
+
+@app.command("generate-data")
+def generate_data(
+    players: int = typer.Option(100_000, help="Players to create"),
+    games_per_player: float = typer.Option(10.0, help="Mean completed games per player (Poisson)"),
+    skill_alpha: float = typer.Option(5.0, help="Alpha of the Beta distribution of player skill"),
+    skill_beta: float = typer.Option(2.0, help="Beta of the Beta distribution of player skill"),
+    days: int = typer.Option(30, help="Spread player sign-ups and games over this many past days"),
+    db_name: Optional[str] = typer.Option(None, help="Database to fill, DB_NAME by default"),
+    name_prefix: str = typer.Option("player", help="Player names are <prefix>_<index>"),
+    workers: int = typer.Option(os.cpu_count() or 1, help="Generator processes"),
+    chunk_players: int = typer.Option(10_000, help="Players per worker task"),
+    batch_size: int = typer.Option(1000, help="Sessions per insert_many batch"),
+    seed: int = typer.Option(0, help="Same seed and options give the same dataset")
+):
+    """Synthesize players and completed games into MongoDB for capacity testing"""
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+    from synthetic import generate_to_mongo, synthesize, validate_sample
+
+    options = dict(games_per_player=games_per_player, skill_alpha=skill_alpha, skill_beta=skill_beta,
+                   days=days, batch_size=batch_size, name_prefix=name_prefix)
+    chunks = [
+        dict(worker_seed=seed * 1_000_003 + first, first_player=first,
+             players=min(chunk_players, players - first), **options)
+        for first in range(0, players, chunk_players)
+    ]
+    validate_sample(*next(synthesize(**{**chunks[0], "players": 1})))
+
+    start = time.perf_counter()
+    created_players = created_sessions = 0
+    db_name = db_name or os.environ['DB_NAME']
+
+    async def prepare():
+        client = create_client()
+        try:
+            await ensure_indexes(client[db_name])
+        finally:
+            client.close()
+
+    asyncio.run(prepare())
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Each worker streams its batches straight into MongoDB, only counts come back
+        results = pool.map(partial(generate_to_mongo, os.environ['MONGO_URL'], db_name), chunks)
+        for chunk_players_done, chunk_sessions in results:
+            created_players += chunk_players_done
+            created_sessions += chunk_sessions
+            typer.echo(f"{created_players} players, {created_sessions} sessions")
+
+    elapsed = time.perf_counter() - start
+    typer.echo(f"Created {created_players} players and {created_sessions} sessions in {elapsed:.1f}s "
+               f"({created_sessions / elapsed:.0f} sessions/s, {workers} workers)")
+
+
+@app.command("loadtest")
+def loadtest(
+    players: int = typer.Option(50, help="Concurrent players"),
+    games: int = typer.Option(5, help="Games per player"),
+    url: Optional[str] = typer.Option(None, help="Base URL of a running server, in-process when not given"),
+    backend: str = typer.Option("memory", help="Storage backend for in-process runs: memory or mongo"),
+    db_name: str = typer.Option("bench_loadtest", help="Scratch database of in-process mongo runs, dropped afterwards"),
+    think_ms: float = typer.Option(0.0, help="Pause before every answer"),
+    baseline_out: Optional[Path] = typer.Option(None, help="Write the results as a JSON baseline"),
+    compare: Optional[Path] = typer.Option(None, help="Baseline JSON to diff the results against")
+):
+    """Simulate concurrent players playing full games and report per-endpoint latency"""
+    import httpx
+    from loadtest import LoadTest, compare_results, read_baseline, write_baseline
+
+    async def run():
+        counter = CommandCounter()
+        mongo_client = None
+        if url:
+            # DB operations of a remote server are read from the server-wide counters
+            mongo_client = create_client()
+            db = mongo_client[os.environ['DB_NAME']]
+            opcounters = (await db.command("serverStatus"))["opcounters"]
+            client = httpx.AsyncClient(base_url=url, timeout=30)
+        else:
+            import server
+            if backend == "mongo":
+                mongo_client = create_client(event_listeners=[counter])
+                await mongo_client.drop_database(db_name)
+            server.use_stores(create_stores(backend, mongo_client[db_name] if mongo_client else None))
+            await server.start_app()
+            await server.wait_until_ready()
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://loadtest")
+        try:
+            counter.count = 0
+            results = await LoadTest(client, players, games, think_ms / 1000).run()
+            if url:
+                after = (await db.command("serverStatus"))["opcounters"]
+                db_operations = sum(after[name] - opcounters[name] for name in ("insert", "query", "update", "delete", "command"))
+            else:
+                db_operations = counter.count
+            results["db_operations_per_game"] = round(db_operations / max(results["completed_games"], 1), 2)
+            results["target"] = url or f"in-process ({backend})"
+            return results
+        finally:
+            await client.aclose()
+            if not url:
+                await server.stop_app()
+            if mongo_client:
+                if not url:
+                    await mongo_client.drop_database(db_name)
+                mongo_client.close()
+
+    results = asyncio.run(run())
+    typer.echo(f"{results['target']}: {results['completed_games']} games ({results['failed_games']} failed) in "
+               f"{results['elapsed_seconds']}s | {results['games_per_second']} games/s | "
+               f"{results['db_operations_per_game']} DB operations/game")
+    for endpoint, stats in results["endpoints"].items():
+        typer.echo(f"  {endpoint}: {stats['requests_per_second']} req/s | p50 {stats['p50_ms']}ms  "
+                   f"p95 {stats['p95_ms']}ms  p99 {stats['p99_ms']}ms | {stats['errors']} errors")
+    if baseline_out:
+        write_baseline(baseline_out, results)
+    if compare:
+        typer.echo(f"Compared with {compare}:")
+        for line in compare_results(read_baseline(compare), results):
+            typer.echo(f"  {line}")
+
+
+@app.command("bench-workers")
+def bench_workers(
+    max_workers: int = typer.Option(os.cpu_count() or 1, help="Largest number of uvicorn workers"),
+    players: int = typer.Option(25, help="Concurrent players per server worker"),
+    games: int = typer.Option(4, help="Games per player"),
+    clients: int = typer.Option(0, help="Load generator processes, as many as server workers when 0"),
+    port: int = typer.Option(8765, help="Port of the benchmark server"),
+    db_name: str = typer.Option("bench_workers", help="Scratch database, dropped before every run")
+):
+    """Games/s of 1 to max_workers uvicorn workers sharing one MongoDB database"""
+    import subprocess
+    import sys
+    from concurrent.futures import ProcessPoolExecutor
+    import httpx
+    from loadtest import run_against
+
+    async def drop_database():
+        client = create_client()
+        try:
+            await client.drop_database(db_name)
+        finally:
+            client.close()
+
+    def wait_until_ready(url: str, server: subprocess.Popen, workers: int, timeout: float = 60.0) -> None:
+        """
+        Poll the readiness check until it passes several times in a row: each
+        request is a new connection, answered by whichever worker accepts it
+        """
+        deadline = time.monotonic() + timeout
+        ready_in_a_row = 0
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with code {server.returncode}")
+            try:
+                ready = httpx.get(f"{url}/api/ready", timeout=1).status_code == 200
+            except httpx.TransportError:
+                ready = False
+            ready_in_a_row = ready_in_a_row + 1 if ready else 0
+            if ready_in_a_row >= 4 * workers:
+                return
+            time.sleep(0.05 if ready else 0.2)
+        raise RuntimeError("Server did not become ready")
+
+    url = f"http://127.0.0.1:{port}"
+    counts = sorted({1, max_workers} | {2 ** power for power in range(max_workers.bit_length()) if 2 ** power <= max_workers})
+    baseline = None
+    typer.echo(f"{'workers':>7} | {'games/s':>8} | {'speedup':>7} | efficiency")
+    for workers in counts:
+        asyncio.run(drop_database())
+        env = {**os.environ, "STORAGE_BACKEND": "mongo", "DB_NAME": db_name, "WEB_CONCURRENCY": str(workers)}
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--workers", str(workers),
+             "--log-level", "warning"],
+            cwd=ROOT_DIR, env=env
+        )
+        try:
+            wait_until_ready(url, server, workers)
+            generators = clients or workers
+            total_players = players * workers
+            per_generator = -(-total_players // generators)
+            start = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=generators) as pool:
+                runs = list(pool.map(
+                    run_against, [url] * generators, [per_generator] * generators, [games] * generators,
+                    [0.0] * generators, [index * per_generator for index in range(generators)]
+                ))
+            elapsed = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+
+        completed = sum(run["completed_games"] for run in runs)
+        failed = sum(run["failed_games"] for run in runs)
+        games_per_second = completed / elapsed
+        baseline = baseline or games_per_second
+        speedup = games_per_second / baseline
+        typer.echo(f"{workers:>7} | {games_per_second:>8.1f} | {speedup:>6.2f}x | {speedup / workers:>9.0%}"
+                   + (f" ({failed} games failed)" if failed else ""))
+    asyncio.run(drop_database())
+
+
+@app.command("profile-startup")
+def profile_startup(
+    top: int = typer.Option(15, help="Number of top-level packages to list, slowest first"),
+    runs: int = typer.Option(3, help="Cold starts to time, the fastest one is reported"),
+    budget_ms: Optional[float] = typer.Option(None, help="Fail when the time to first request is over this"),
+    ready_timeout: float = typer.Option(30.0, help="Seconds to wait for /api/ready before failing")
+):
+    """Import time per package and the cold start phases of the API up to its first request"""
+    import json
+    import subprocess
+    import sys
+    from startup_profile import parse_importtime
+
+    imports = subprocess.run([sys.executable, "-X", "importtime", "-c", "import server"],
+                             cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    packages = parse_importtime(imports.stderr)
+    total = sum(milliseconds for _, milliseconds in packages)
+    typer.echo(f"import server: {total:.0f}ms (with -X importtime overhead)")
+    for package, milliseconds in packages[:top]:
+        typer.echo(f"{package:>28} {milliseconds:>7.1f}ms {milliseconds / total:>6.1%}")
+
+    fastest = None
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "startup_profile.py", repr(time.time()), repr(ready_timeout)],
+                                cwd=ROOT_DIR, capture_output=True, text=True)
+        if not result.stdout.strip():
+            typer.echo(result.stderr)
+            raise typer.Exit(code=1)
+        phases = json.loads(result.stdout.strip().splitlines()[-1])
+        if phases["ready"] is None:
+            typer.echo(f"Not ready after {ready_timeout:.0f}s (status {phases['ready_status']})")
+            raise typer.Exit(code=1)
+        phases["first_request_total"] = sum(
+            phases[phase] for phase in ("interpreter", "import", "startup", "first_request")
+        )
+        if fastest is None or phases["first_request_total"] < fastest["first_request_total"]:
+            fastest = phases
+
+    typer.echo(f"Fastest of {runs} cold starts:")
+    for phase in ("interpreter", "import", "startup", "first_request"):
+        typer.echo(f"{phase:>28} {fastest[phase] * 1000:>7.1f}ms")
+    typer.echo(f"{'time to first request':>28} {fastest['first_request_total'] * 1000:>7.1f}ms "
+               f"(status {fastest['first_request_status']})")
+    typer.echo(f"{'ready after startup':>28} {fastest['ready'] * 1000:>7.1f}ms "
+               f"(status {fastest['ready_status']})")
+    if budget_ms is not None and fastest["first_request_total"] * 1000 > budget_ms:
+        typer.echo(f"Over the {budget_ms:.0f}ms budget")
+        raise typer.Exit(code=1)
+
+
+@app.command("bench-cache")
+def bench_cache(
+    games: int = typer.Option(200, help="Games to play per cache mode"),
+    db_name: str = typer.Option("bench_session_cache", help="Scratch database, dropped afterwards"),
+    backend: str = typer.Option("mongo", help="Storage backend: mongo or memory")
+):
+    """Compare DB round-trips and latency per game with the session cache off and on"""
+    import server
+    from models import StartGameRequest, SubmitAnswerRequest
+
+    # The handlers are called directly and their response models read
+    server.fast_json = False
+
+    async def play_game(game: int, round_latencies: List[float]) -> float:
+        game_start = time.perf_counter()
+        game_state = await server.start_game(StartGameRequest(player_name=f"bench_{game}"))
+        for _ in range(10):
+            start = time.perf_counter()
+            current = await server.get_game_session(game_state.session_id)
+            await server.submit_answer(
+                game_state.session_id, SubmitAnswerRequest(player_answer=current.correct_answer)
+            )
+            round_latencies.append(time.perf_counter() - start)
+        return time.perf_counter() - game_start
+
+    async def run():
+        counter = CommandCounter()
+        client = create_client(event_listeners=[counter]) if backend == "mongo" else None
+        try:
+            for mode in ("off", WRITE_THROUGH, WRITE_BEHIND):
+                if client:
+                    await client.drop_database(db_name)
+                server.use_stores(create_stores(backend, client[db_name] if client else None), cache_mode=mode)
+                counter.count = 0
+                round_latencies: List[float] = []
+                game_latencies = [await play_game(game, round_latencies) for game in range(games)]
+                if server.session_cache:
+                    await server.session_cache.close()
+                round_trips = counter.count / games
+                typer.echo(f"{mode:>13}: {round_trips:.1f} DB round-trips/game | "
+                           f"round {format_latency(round_latencies)} | game {format_latency(game_latencies)}")
+        finally:
+            if client:
+                await client.drop_database(db_name)
+                client.close()
+
+    asyncio.run(run())
+
+
+@app.command("bench-prefetch")
+def bench_prefetch(
+    players: int = typer.Option(50, help="Concurrent players"),
+    games: int = typer.Option(4, help="Games per player"),
+    latency_ms: float = typer.Option(150.0, help="Simulated network round-trip per request"),
+    db_name: str = typer.Option("bench_prefetch", help="Scratch database, dropped afterwards"),
+    backend: str = typer.Option("mongo", help="Storage backend: mongo or memory")
+):
+    """Load-test per-answer play against prefetched games with one batch submission"""
+    import server
+    from models import BatchAnswer, StartGameRequest, SubmitAnswerRequest, SubmitAnswersRequest
+
+    # The handlers are called directly and their response models read
+    server.fast_json = False
+
+    requests = 0
+
+    async def call(handler, *args):
+        nonlocal requests
+        requests += 1
+        await asyncio.sleep(latency_ms / 1000)
+        return await handler(*args)
+
+    async def play_per_answer(player: int):
+        game_state = await call(server.start_game, StartGameRequest(player_name=f"bench_{player}"))
+        answer = game_state.correct_answer
+        for _ in range(10):
+            result = await call(server.submit_answer, game_state.session_id,
+                                SubmitAnswerRequest(player_answer=answer, time_taken=1.0))
+            answer = result.next_correct_answer
+
+    async def play_prefetched(player: int):
+        game_state = await call(server.start_game, StartGameRequest(player_name=f"bench_{player}", prefetch=True))
+        answers = [BatchAnswer(player_answer=question.correct_answer, time_taken=1.0,
+                               round_number=question.round_number)
+                   for question in game_state.questions]
+        await call(server.submit_answers, game_state.session_id, SubmitAnswersRequest(answers=answers))
+
+    async def run():
+        nonlocal requests
+        client = create_client() if backend == "mongo" else None
+        server.use_stores(create_stores(backend, client[db_name] if client else None), cache_mode="off")
+        try:
+            for mode, play in (("per-answer", play_per_answer), ("prefetch", play_prefetched)):
+                requests = 0
+                game_latencies: List[float] = []
+
+                async def player_loop(player: int):
+                    for _ in range(games):
+                        start = time.perf_counter()
+                        await play(player)
+                        game_latencies.append(time.perf_counter() - start)
+
+                wall_start, cpu_start = time.perf_counter(), time.process_time()
+                await asyncio.gather(*(player_loop(player) for player in range(players)))
+                wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+                total_games = players * games
+                typer.echo(f"{mode:>10}: {requests / total_games:.0f} requests/game | "
+                           f"{total_games / wall:.1f} games/s | {cpu / total_games * 1000:.2f}ms server CPU/game | "
+                           f"game {format_latency(game_latencies)}")
+        finally:
+            if client:
+                await client.drop_database(db_name)
+                client.close()
+
+    asyncio.run(run())
+
+
+@app.command("bench-leaderboard")
+def bench_leaderboard(
+    players: int = typer.Option(1_000_000, help="Synthetic players"),
+    queries: int = typer.Option(100_000, help="Rank queries and updates to time")
+):
+    """Time building, rank queries, top-N reads and updates of the in-memory leaderboard"""
+    import random
+    from leaderboard import Leaderboard
+
+    synthetic = [
+        {"player_id": f"player-{index}", "name": f"Player {index}",
+         "best_score": random.randint(0, 10), "total_score": random.randint(0, 5000)}
+        for index in range(players)
+    ]
+    board = Leaderboard()
+    start = time.perf_counter()
+    board.load(synthetic)
+    typer.echo(f"build: {time.perf_counter() - start:.2f}s for {players} players")
+
+    sample = [f"player-{random.randrange(players)}" for _ in range(queries)]
+    start = time.perf_counter()
+    for player_id in sample:
+        board.player(player_id)
+    typer.echo(f"rank query: {(time.perf_counter() - start) / queries * 1e6:.2f}µs")
+
+    start = time.perf_counter()
+    for _ in range(queries):
+        board.top(10)
+    typer.echo(f"top 10: {(time.perf_counter() - start) / queries * 1e6:.2f}µs")
+
+    start = time.perf_counter()
+    for player_id in sample:
+        board.update(player_id, player_id, random.randint(0, 10), random.randint(0, 5000))
+    typer.echo(f"update: {(time.perf_counter() - start) / queries * 1e6:.2f}µs")
+
+
+@app.command("bench-adaptive")
+def bench_adaptive(count: int = typer.Option(100000, help="Answers to rate and questions to pick")):
+    """Time rating an answer and picking the next adaptive question"""
+    from skill import SkillRatings
+
+    ratings = SkillRatings(store=None)
+    ratings.load("bench", None)
+    latencies = []
+    for index in range(count):
+        start = time.perf_counter()
+        (_, _, _, operation), tier = ratings.next_question("bench", index % 10 + 1)
+        ratings.record("bench", operation, tier, index % 3 != 0)
+        latencies.append(time.perf_counter() - start)
+    typer.echo(f"rate + pick next question: p50 {percentile(latencies, 50) * 1e6:.2f}µs  "
+               f"p99 {percentile(latencies, 99) * 1e6:.2f}µs")
+
+
+@app.command("bench-questions")
+def bench_questions(
+    count: int = typer.Option(100000, help="Questions to generate per round"),
+    batch_size: int = typer.Option(1000, help="Question pool refill batch size")
+):
+    """Compare scalar, batch and pooled question generation per round"""
+    from game_logic import generate_question, generate_questions
+    from question_pool import QuestionPool
+
+    pool = QuestionPool(batch_size=batch_size)
+    for round_number in range(1, 11):
+        start = time.perf_counter()
+        for _ in range(count):
+            generate_question(round_number)
+        scalar = time.perf_counter() - start
+
+        start = time.perf_counter()
+        generate_questions(round_number, count)
+        batch = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(count):
+            pool.pop(round_number)
+        pooled = time.perf_counter() - start
+
+        typer.echo(f"round {round_number:>2}: scalar {scalar / count * 1e6:.2f}µs | "
+                   f"batch {batch / count * 1e6:.2f}µs ({scalar / batch:.1f}x) | "
+                   f"pool pop {pooled / count * 1e6:.2f}µs ({scalar / pooled:.1f}x)")
+
+
+@app.command("bench-schema")
+def bench_schema(
+    sessions: int = typer.Option(2000, help="Completed sessions per layout"),
+    db_name: str = typer.Option("bench_session_schema", help="Scratch database, dropped afterwards")
+):
+    """Compare bytes per session and read latency of the stored session layouts"""
+    import bson
+    from game_logic import generate_question, new_seed, question_for_round
+    from models import GameSession, RoundData
+
+    def completed_session(seeded: bool) -> dict:
+        seed = new_seed() if seeded else None
+        rounds = []
+        for round_number in range(1, 11):
+            question, correct_answer, _, operation = (
+                question_for_round(seed, round_number) if seeded else generate_question(round_number)
+            )
+            rounds.append(RoundData(
+                round_number=round_number,
+                question=None if seeded else question,
+                operation=operation,
+                correct_answer=correct_answer,
+                player_answer=correct_answer,
+                is_correct=True,
+                time_taken=round(1.5 + round_number / 7, 3)
+            ))
+        return GameSession(player_id="bench", seed=seed, rounds_data=rounds, current_round=10,
+                           score=10, is_completed=True).dict()
+
+    layouts = {
+        "v1": lambda session: session,
+        "v2": encode_session,
+        "v2 packed": lambda session: encode_session(session, pack=True),
+    }
+
+    async def run():
+        client, db = get_db()
+        db = client[db_name]
+        try:
+            for kind, seeded in (("seeded", True), ("stored questions", False)):
+                documents = [completed_session(seeded) for _ in range(sessions)]
+                for layout, encode in layouts.items():
+                    await db.game_sessions.drop()
+                    encoded = [encode(dict(document)) for document in documents]
+                    size = sum(len(bson.encode(document)) for document in encoded) / sessions
+                    await db.game_sessions.insert_many(encoded)
+                    await db.game_sessions.create_index("session_id", unique=True)
+
+                    latencies = []
+                    for document in documents:
+                        start = time.perf_counter()
+                        decode_session(await db.game_sessions.find_one(
+                            {"session_id": document["session_id"]}, {"_id": 0}
+                        ))
+                        latencies.append(time.perf_counter() - start)
+                    typer.echo(f"{kind:>16} {layout:>9}: {size:.0f} bytes/session | "
+                               f"read + decode {format_latency(latencies)}")
+        finally:
+            await client.drop_database(db_name)
+            client.close()
+
+    asyncio.run(run())
+
+
+@app.command("bench-micro")
+def bench_micro(
+    baseline: Path = typer.Option(ROOT_DIR / "microbench_baseline.json", help="Stored baseline to compare against"),
+    save_baseline: bool = typer.Option(False, help="Store these results as the new baseline"),
+    threshold: float = typer.Option(0.15, help="Allowed drop in ops/s (or growth in peak bytes), as a fraction"),
+    min_time: float = typer.Option(0.2, help="Seconds per timing run")
+):
+    """
+    Time question generation and model (de)serialization, fail on regressions against the baseline.
+    Baselines are machine-specific and not committed: record one with --save-baseline on the machine
+    that compares against it, e.g. before a change.
+    """
+    import json
+    from microbench import find_regressions, run_benchmarks
+
+    if not save_baseline and not baseline.exists():
+        typer.echo(f"No baseline at {baseline}, nothing to compare against. "
+                   f"Record one first with `bench-micro --save-baseline`.")
+        raise typer.Exit(code=1)
+    results = run_benchmarks(min_time)
+    stored = json.loads(baseline.read_text()) if baseline.exists() else {}
+    for name, result in results.items():
+        before = stored.get(name)
+        change = f" ({result['ops_per_second'] / before['ops_per_second'] - 1:+.1%})" if before else ""
+        typer.echo(f"{name:>36}: {result['ops_per_second']:>12,.0f} ops/s{change:<10} | "
+                   f"{result['peak_bytes']:>7} peak bytes")
+
+    if save_baseline:
+        baseline.write_text(json.dumps(results, indent=2, sort_keys=True))
+        typer.echo(f"Baseline saved to {baseline}")
+        return
+    regressions = find_regressions(stored, results, threshold)
+    if regressions:
+        typer.echo(f"Regressions beyond {threshold:.0%} of {baseline}:")
+        for regression in regressions:
+            typer.echo(f"  {regression}")
+        raise typer.Exit(code=1)
+
+
+@app.command("bench-json")
+def bench_json(
+    players: int = typer.Option(20, help="Concurrent players per run"),
+    games: int = typer.Option(10, help="Games per player"),
+    rounds: int = typer.Option(3, help="Runs per mode, alternating, the best one is kept")
+):
+    """Check FAST_JSON responses against the regular ones byte for byte, then compare requests/s on one core"""
+    import logging
+    import httpx
+    import server
+    from loadtest import LoadTest
+    from response_contract import scripted_responses
+
+    async def run(fast_json: bool, load: bool):
+        server.fast_json = fast_json
+        server.use_stores(create_stores("memory"), cache_mode="off")
+        await server.start_app()
+        await server.wait_until_ready()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench-json")
+        try:
+            if not load:
+                return await scripted_responses(client)
+            server.tracer.requests.clear()
+            results = await LoadTest(client, players, games).run()
+            # Time spent in the app, without the load generator sharing the core
+            histogram = server.tracer.requests[("POST", "/api/games/{session_id}/answer", "200")]
+            results["answer_server_seconds"] = histogram.total / histogram.count
+            return results
+        finally:
+            await client.aclose()
+            await server.stop_app()
+
+    # One log line per request would dominate the timings
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    regular, fast = asyncio.run(run(False, False)), asyncio.run(run(True, False))
+    mismatches = [(request, expected, actual) for (request, expected), (_, actual) in zip(regular, fast)
+                  if expected != actual]
+    typer.echo(f"Contract: {len(regular) - len(mismatches)}/{len(regular)} responses byte-identical")
+    for request, expected, actual in mismatches:
+        typer.echo(f"  {request}\n    regular: {expected!r}\n    fast:    {actual!r}")
+    if mismatches or len(regular) != len(fast):
+        raise typer.Exit(code=1)
+
+    best = {False: None, True: None}
+    for _ in range(rounds):
+        for fast_json in (False, True):
+            results = asyncio.run(run(fast_json, True))
+            if best[fast_json] is None or results["answer_server_seconds"] < best[fast_json]["answer_server_seconds"]:
+                best[fast_json] = results
+
+    for fast_json, results in best.items():
+        typer.echo(f"{'FAST_JSON=1' if fast_json else 'regular':>12}: answer {results['answer_server_seconds'] * 1e6:>6.0f}us "
+                   f"in the app = {1 / results['answer_server_seconds']:>6.0f} req/s per core | "
+                   f"{results['games_per_second']:>6.1f} games/s end to end")
+    change = best[False]["answer_server_seconds"] / best[True]["answer_server_seconds"] - 1
+    typer.echo(f"Fast path: {change:+.1%} answer requests/s per core")
+
+
+if __name__ == "__main__":
+    app()
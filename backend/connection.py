@@ -0,0 +1,41 @@
+import os
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+
+# Motor client settings read from the environment: (variable, client option, type).
+# Unset variables keep the driver defaults. Every worker process has its own
+# pool, so the server sees up to workers x MONGO_MAX_POOL_SIZE connections.
+CLIENT_OPTIONS = [
+    ("MONGO_MAX_POOL_SIZE", "maxPoolSize", int),
+    ("MONGO_MIN_POOL_SIZE", "minPoolSize", int),
+    ("MONGO_MAX_IDLE_TIME_MS", "maxIdleTimeMS", int),
+    ("MONGO_WAIT_QUEUE_TIMEOUT_MS", "waitQueueTimeoutMS", int),
+    ("MONGO_CONNECT_TIMEOUT_MS", "connectTimeoutMS", int),
+    ("MONGO_SOCKET_TIMEOUT_MS", "socketTimeoutMS", int),
+    ("MONGO_SERVER_SELECTION_TIMEOUT_MS", "serverSelectionTimeoutMS", int),
+    # Wire compression in order of preference, e.g. "zstd,snappy,zlib"
+    ("MONGO_COMPRESSORS", "compressors", str),
+    ("MONGO_ZLIB_COMPRESSION_LEVEL", "zlibCompressionLevel", int),
+]
+
+
+def client_options() -> dict:
+    return {
+        option: parse(os.environ[variable])
+        for variable, option, parse in CLIENT_OPTIONS
+        if os.environ.get(variable)
+    }
+
+
+def create_client(url: str = None, **options) -> "AsyncIOMotorClient":
+    """
+    A client configured from the environment. Create it inside the process that
+    uses it (on startup, not at import): a client must not cross a fork.
+    """
+    # Motor pulls in multiprocessing, imported here to keep it out of the cold start
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    return AsyncIOMotorClient(url or os.environ['MONGO_URL'], **{**client_options(), **options})
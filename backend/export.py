@@ -0,0 +1,172 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional
+
+from game_logic import question_for_round
+from storage import GameStore
+
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+SESSION_COLUMNS = ["session_id", "player_id", "seed", "adaptive", "score", "started_at", "completed_at"]
+ROUND_COLUMNS = ["round_number", "question", "operation", "correct_answer", "player_answer",
+                 "is_correct", "time_taken", "difficulty"]
+
+# Sessions completed in the last seconds may still be committing with an
+# earlier completed_at, so an export stops this far behind the clock
+WATERMARK_LAG = timedelta(seconds=60)
+
+
+def naive_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    """Stored datetimes are naive UTC"""
+    if moment is not None and moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def export_window(since: Optional[datetime], until: Optional[datetime] = None) -> datetime:
+    """
+    The upper bound of an export, which is also the watermark of the next one.
+    Never later than WATERMARK_LAG ago, whatever the caller asks for.
+    """
+    latest = datetime.utcnow() - WATERMARK_LAG
+    until = min(naive_utc(until), latest) if until is not None else latest
+    if since is not None and until < since:
+        until = since
+    return until
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def session_rows(session: dict) -> List[list]:
+    """One flat row per round, the session fields repeated"""
+    session_values = [session.get(column) for column in SESSION_COLUMNS]
+    return [
+        session_values + [round_data.get(column) for column in ROUND_COLUMNS]
+        for round_data in session.get("rounds_data") or []
+    ]
+
+
+async def with_questions(sessions: AsyncIterator[dict]) -> AsyncIterator[dict]:
+    """Seeded sessions do not store their questions, they are recomputed from the seed"""
+    async for session in sessions:
+        seed = session.get("seed")
+        rounds_data = session.get("rounds_data") or []
+        if seed is not None and any(round_data.get("question") is None for round_data in rounds_data):
+            session = {**session, "rounds_data": [
+                {**round_data, "question": question_for_round(seed, round_data["round_number"])[0]}
+                if round_data.get("question") is None else round_data
+                for round_data in rounds_data
+            ]}
+        yield session
+
+
+async def _batches(sessions: AsyncIterator[dict], batch_size: int) -> AsyncIterator[List[dict]]:
+    batch = []
+    async for session in sessions:
+        batch.append(session)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def ndjson_chunks(sessions: AsyncIterator[dict], batch_size: int) -> AsyncIterator[bytes]:
+    """One JSON object per session with its rounds nested"""
+    async for batch in _batches(sessions, batch_size):
+        yield "".join(json.dumps(session, default=_json_default) + "\n" for session in batch).encode()
+
+
+async def csv_chunks(sessions: AsyncIterator[dict], batch_size: int) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(SESSION_COLUMNS + ROUND_COLUMNS)
+    async for batch in _batches(sessions, batch_size):
+        for session in batch:
+            for row in session_rows(session):
+                writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Header only, nothing was exported
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write target of the Parquet writer, drained after every row group"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+async def parquet_chunks(sessions: AsyncIterator[dict], batch_size: int) -> AsyncIterator[bytes]:
+    """Flat rows as Parquet, one row group per batch of sessions"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("session_id", pa.string()), ("player_id", pa.string()), ("seed", pa.int64()),
+        ("adaptive", pa.bool_()), ("score", pa.int32()), ("started_at", pa.timestamp("ms")),
+        ("completed_at", pa.timestamp("ms")), ("round_number", pa.int32()), ("question", pa.string()),
+        ("operation", pa.string()), ("correct_answer", pa.int64()), ("player_answer", pa.int64()),
+        ("is_correct", pa.bool_()), ("time_taken", pa.float64()), ("difficulty", pa.int32()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    async for batch in _batches(sessions, batch_size):
+        rows = [row for session in batch for row in session_rows(session)]
+        columns = list(zip(*rows)) if rows else [[] for _ in schema]
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+        ))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+EXPORTERS = {
+    "ndjson": ndjson_chunks,
+    "csv": csv_chunks,
+    "parquet": parquet_chunks,
+}
+
+
+def export_sessions(store: GameStore, export_format: str, since: Optional[datetime], until: datetime,
+                    batch_size: int = 1000) -> AsyncIterator[bytes]:
+    """
+    Stream the sessions completed in (since, until] in the given format. Only
+    one batch of sessions is held in memory at a time.
+    """
+    sessions = with_questions(store.completed_sessions(since, until, batch_size=batch_size))
+    return EXPORTERS[export_format](sessions, batch_size)
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
@@ -1,12 +1,20 @@
 import random
-from typing import Tuple, List
+from datetime import datetime
+from typing import TYPE_CHECKING, Tuple, List
 
+if TYPE_CHECKING:
+    import numpy as np
 
-def generate_question(round_number: int) -> Tuple[str, int, List[int], str]:
+
+def generate_question(round_number: int, rng: random.Random = None,
+                      operation: str = None) -> Tuple[str, int, List[int], str]:
     """
     Generate a math question based on the round number
+    Draws from rng when given, otherwise from the global random module
+    Uses the given operation instead of a random one when set
     Returns: (question_string, correct_answer, answer_options, operation)
     """
+    rng = rng or random
     operations = ['+', '-', '×', '÷']
     
     # Increase difficulty with rounds
@@ -14,31 +22,31 @@ def generate_question(round_number: int) -> Tuple[str, int, List[int], str]:
     
     # Boss level (round 10) - more challenging
     if round_number == 10:
-        operation = operations[random.randint(0, 3)]
+        operation = operation or operations[rng.randint(0, 3)]
         if operation == '×':
-            num1 = random.randint(5, 12)
-            num2 = random.randint(5, 12)
+            num1 = rng.randint(5, 12)
+            num2 = rng.randint(5, 12)
         elif operation == '÷':
-            correct_answer = random.randint(2, 10)
-            num2 = random.randint(2, 9)
+            correct_answer = rng.randint(2, 10)
+            num2 = rng.randint(2, 9)
             num1 = correct_answer * num2
         else:
-            num1 = random.randint(10, 25)
-            num2 = random.randint(10, 25)
+            num1 = rng.randint(10, 25)
+            num2 = rng.randint(10, 25)
     else:
         # Progressive difficulty for rounds 1-9
-        operation = operations[random.randint(0, 3)]
+        operation = operation or operations[rng.randint(0, 3)]
         
         if operation == '×':
-            num1 = random.randint(1, min(round_number + 2, 10))
-            num2 = random.randint(1, min(round_number + 2, 10))
+            num1 = rng.randint(1, min(round_number + 2, 10))
+            num2 = rng.randint(1, min(round_number + 2, 10))
         elif operation == '÷':
-            correct_answer = random.randint(1, max_number)
-            num2 = random.randint(1, min(round_number + 1, 8))
+            correct_answer = rng.randint(1, max_number)
+            num2 = rng.randint(1, min(round_number + 1, 8))
             num1 = correct_answer * num2
         else:
-            num1 = random.randint(1, max_number)
-            num2 = random.randint(1, max_number)
+            num1 = rng.randint(1, max_number)
+            num2 = rng.randint(1, max_number)
     
     # Calculate correct answer
     if operation == '+':
@@ -59,11 +67,11 @@ def generate_question(round_number: int) -> Tuple[str, int, List[int], str]:
     attempts = 0
     while len(wrong_answers) < 2 and attempts < 20:
         if operation == '×':
-            wrong = correct_answer + random.randint(-20, 20)
+            wrong = correct_answer + rng.randint(-20, 20)
         elif operation == '÷':
-            wrong = correct_answer + random.randint(-8, 8)
+            wrong = correct_answer + rng.randint(-8, 8)
         else:
-            wrong = correct_answer + random.randint(-10, 10)
+            wrong = correct_answer + rng.randint(-10, 10)
         
         if wrong != correct_answer and wrong > 0 and wrong not in wrong_answers:
             wrong_answers.append(wrong)
@@ -77,13 +85,90 @@ def generate_question(round_number: int) -> Tuple[str, int, List[int], str]:
     
     # Shuffle all answers
     all_answers = [correct_answer] + wrong_answers
-    random.shuffle(all_answers)
+    rng.shuffle(all_answers)
     
     question = f"{num1} {operation} {num2}"
     
     return question, correct_answer, all_answers, operation
 
 
+def new_seed() -> int:
+    """Random per-session seed that fits in a MongoDB int64"""
+    return random.getrandbits(63)
+
+
+def round_rng(seed: int, round_number: int) -> random.Random:
+    """Independent RNG stream for one round of a seeded session"""
+    return random.Random(f"{seed}:{round_number}")
+
+
+def question_for_round(seed: int, round_number: int) -> Tuple[str, int, List[int], str]:
+    """Recompute the question of a seeded session's round, same seed gives the same question"""
+    return generate_question(round_number, round_rng(seed, round_number))
+
+
+OPERATIONS = ['+', '-', '×', '÷']
+
+
+def generate_questions(round_number: int, n: int,
+                       rng: "np.random.Generator" = None) -> List[Tuple[str, int, List[int], str]]:
+    """
+    Generate n math questions for a round at once with NumPy.
+    Follows the same ranges and boss rules as generate_question.
+    Returns: list of (question_string, correct_answer, answer_options, operation)
+    """
+    # Imported here to keep NumPy out of the server's cold start
+    import numpy as np
+
+    rng = rng if rng is not None else np.random.default_rng()
+    max_number = min(5 + round_number, 12)
+    op_codes = rng.integers(0, 4, n)
+
+    # Operand ranges per operation, inclusive: (+/-, ×, ÷ answer, ÷ divisor)
+    if round_number == 10:
+        add_range, mul_range, div_answer_range, div_range = (10, 25), (5, 12), (2, 10), (2, 9)
+    else:
+        mul_max = min(round_number + 2, 10)
+        add_range, mul_range = (1, max_number), (1, mul_max)
+        div_answer_range, div_range = (1, max_number), (1, min(round_number + 1, 8))
+
+    def draw(bounds):
+        return rng.integers(bounds[0], bounds[1] + 1, n)
+
+    add1, add2 = draw(add_range), draw(add_range)
+    mul1, mul2 = draw(mul_range), draw(mul_range)
+    div_answer, div2 = draw(div_answer_range), draw(div_range)
+
+    is_add, is_sub, is_mul = op_codes == 0, op_codes == 1, op_codes == 2
+    # Ensure positive result for subtraction
+    sub1, sub2 = np.maximum(add1, add2), np.minimum(add1, add2)
+    num1 = np.select([is_add, is_sub, is_mul], [add1, sub1, mul1], div_answer * div2)
+    num2 = np.select([is_add, is_sub, is_mul], [add2, sub2, mul2], div2)
+    correct = np.select([is_add, is_sub, is_mul], [add1 + add2, sub1 - sub2, mul1 * mul2], div_answer)
+
+    # Two distinct wrong answers drawn uniformly from the positive offsets
+    # within the spread, which is what the retry loop in generate_question does
+    spread = np.select([is_mul, op_codes == 3], [20, 8], 10)
+    low = np.maximum(-spread, 1 - correct)
+    has_zero = low <= 0
+    choices = spread - low + 1 - has_zero
+    first = rng.integers(0, choices)
+    second = rng.integers(0, choices - 1)
+    second += second >= first
+    offsets = np.stack([low + first, low + second], axis=1)
+    offsets += (offsets >= 0) & has_zero[:, None]
+
+    options = np.column_stack([correct, correct[:, None] + offsets])
+    options = rng.permuted(options, axis=1)
+
+    return [
+        (f"{a} {OPERATIONS[op]} {b}", answer, row, OPERATIONS[op])
+        for a, op, b, answer, row in zip(
+            num1.tolist(), op_codes.tolist(), num2.tolist(), correct.tolist(), options.tolist()
+        )
+    ]
+
+
 def calculate_player_stats(player_data: dict) -> dict:
     """Calculate comprehensive player statistics"""
     games_played = player_data.get('games_played', 0)
@@ -99,4 +184,21 @@ def calculate_player_stats(player_data: dict) -> dict:
         'boss_levels_completed': player_data.get('boss_levels_completed', 0),
         'perfect_games': player_data.get('perfect_games', 0),
         'average_score': average_score
-    }
\ No newline at end of file
+    }
+
+
+def build_player_stats_update(score: int) -> dict:
+    """
+    Build the MongoDB update that folds a finished game into a player document.
+    Counters use $inc and best_score uses $max, so concurrent games never lose updates.
+    """
+    return {
+        '$inc': {
+            'games_played': 1,
+            'total_score': score,
+            'perfect_games': 1 if score == 10 else 0,  # Perfect game
+            'boss_levels_completed': 1 if score >= 9 else 0  # Completed boss level successfully
+        },
+        '$max': {'best_score': score},
+        '$set': {'last_played': datetime.utcnow()}
+    }
@@ -0,0 +1,104 @@
+import logging
+from datetime import datetime
+from typing import List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+
+# Indexes per collection. Unique indexes back the hot point lookups, the
+# compound ones serve leaderboard and game history queries.
+INDEXES = {
+    "players": [
+        IndexModel([("player_id", ASCENDING)], name="player_id_unique", unique=True),
+        IndexModel([("name", ASCENDING)], name="name_unique", unique=True),
+        IndexModel([("best_score", DESCENDING), ("total_score", DESCENDING)], name="leaderboard"),
+        # Players changed since the last cache sync of a worker
+        IndexModel([("last_played", ASCENDING)], name="last_played"),
+        IndexModel([("created_at", ASCENDING)], name="created_at"),
+    ],
+    "game_sessions": [
+        IndexModel([("session_id", ASCENDING)], name="session_id_unique", unique=True),
+        IndexModel([("player_id", ASCENDING), ("started_at", DESCENDING)], name="player_history"),
+        IndexModel([("is_completed", ASCENDING), ("completed_at", DESCENDING)], name="completed_at"),
+    ],
+    "game_sessions_archive": [
+        IndexModel([("session_ids", ASCENDING)], name="session_ids"),
+        IndexModel([("player_ids", ASCENDING)], name="player_ids"),
+        IndexModel([("completed_from", ASCENDING)], name="completed_from"),
+    ],
+    "leaderboard_rollups": [
+        IndexModel([("window", ASCENDING), ("period", ASCENDING), ("player_id", ASCENDING)],
+                   name="window_player_unique", unique=True),
+        IndexModel([("window", ASCENDING), ("period", ASCENDING),
+                    ("best_score", DESCENDING), ("total_score", DESCENDING)], name="window_ranking"),
+    ],
+}
+
+# Every query shape the API issues: (collection, filter, sort)
+API_QUERIES: List[Tuple[str, dict, list]] = [
+    ("players", {"name": "probe"}, []),
+    ("players", {"player_id": "probe"}, []),
+    ("players", {}, [("best_score", DESCENDING), ("total_score", DESCENDING)]),
+    ("players", {"$or": [{"last_played": {"$gt": datetime(2000, 1, 1)}},
+                         {"created_at": {"$gt": datetime(2000, 1, 1)}}]}, []),
+    ("game_sessions", {"session_id": "probe"}, []),
+    ("game_sessions", {"session_id": "probe", "current_round": 1, "is_completed": False}, []),
+    ("game_sessions", {"player_id": "probe"}, [("started_at", DESCENDING)]),
+    ("game_sessions", {"player_id": "probe", "b": {"$exists": False}}, []),
+    ("game_sessions", {"player_id": "probe", "b": {"$exists": True}}, []),
+    ("game_sessions", {"is_completed": True, "completed_at": {"$lt": datetime(2000, 1, 1)}},
+     [("completed_at", ASCENDING)]),
+    ("game_sessions_archive", {"session_ids": "probe"}, []),
+    ("game_sessions_archive", {"player_ids": "probe"}, []),
+    ("game_sessions_archive", {"player_ids": "probe", "round_columns": {"$exists": True}}, []),
+    ("game_sessions_archive", {"player_ids": "probe", "round_columns": {"$exists": False}}, []),
+    ("game_sessions_archive", {"completed_from": {"$lte": datetime(2000, 1, 1)}},
+     [("completed_from", ASCENDING)]),
+    ("leaderboard_rollups", {"window": "daily", "period": "probe", "player_id": "probe"}, []),
+    ("leaderboard_rollups", {"window": "daily", "period": "probe", "player_id": {"$in": ["probe"]}}, []),
+    ("leaderboard_rollups", {"window": "daily", "period": "probe"},
+     [("best_score", DESCENDING), ("total_score", DESCENDING)]),
+    ("leaderboard_rollups", {"window": "daily", "period": "probe"}, []),
+    ("leaderboard_rollups", {"window": "daily", "period": "probe", "$or": [
+        {"best_score": {"$gt": 0}},
+        {"best_score": 0, "total_score": {"$gt": 0}},
+    ]}, []),
+]
+
+
+async def ensure_indexes(db) -> None:
+    """Create all indexes, safe to call on every startup"""
+    for collection, indexes in INDEXES.items():
+        for index in indexes:
+            try:
+                await db[collection].create_indexes([index])
+            except OperationFailure as e:
+                # e.g. duplicate names written before the unique index existed
+                logging.error(f"Could not create index {index.document['name']} on {collection}: {str(e)}")
+
+
+def plan_stages(plan) -> List[str]:
+    """Collect every stage name in an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+
+async def explain_api_queries(db) -> List[Tuple[str, dict, List[str]]]:
+    """Run explain() on every API query and return (collection, filter, stages) for each"""
+    results = []
+    for collection, query, sort in API_QUERIES:
+        cursor = db[collection].find(query).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        results.append((collection, query, plan_stages(explanation["queryPlanner"]["winningPlan"])))
+    return results
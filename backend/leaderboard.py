@@ -0,0 +1,54 @@
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class Leaderboard:
+    """
+    All-time player ranking by best_score, then total_score, held in memory.
+    Keys are kept sorted in a plain list maintained with bisect, so rank
+    lookups are O(log n) and top-N reads are a slice.
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[int, int, str]] = []  # (-best_score, -total_score, player_id)
+        self._players: Dict[str, Tuple[Tuple[int, int, str], str]] = {}  # player_id -> (key, name)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def load(self, players: Iterable[dict]) -> None:
+        """Rebuild from player documents in one sort"""
+        self._players = {}
+        for player in players:
+            key = (-player.get("best_score", 0), -player.get("total_score", 0), player["player_id"])
+            self._players[player["player_id"]] = (key, player.get("name", ""))
+        self._keys = sorted(key for key, _ in self._players.values())
+
+    def update(self, player_id: str, name: str, best_score: int, total_score: int) -> None:
+        key = (-best_score, -total_score, player_id)
+        previous = self._players.get(player_id)
+        if previous is not None:
+            if previous[0] == key:
+                return
+            del self._keys[bisect_left(self._keys, previous[0])]
+        insort(self._keys, key)
+        self._players[player_id] = (key, name)
+
+    def _entry(self, key: Tuple[int, int, str], name: str) -> dict:
+        return {
+            # Players with the same scores share a rank
+            "rank": bisect_left(self._keys, key[:2]) + 1,
+            "player_id": key[2],
+            "name": name,
+            "best_score": -key[0],
+            "total_score": -key[1],
+        }
+
+    def top(self, limit: int) -> List[dict]:
+        return [self._entry(key, self._players[key[2]][1]) for key in self._keys[:limit]]
+
+    def player(self, player_id: str) -> Optional[dict]:
+        previous = self._players.get(player_id)
+        if previous is None:
+            return None
+        return self._entry(*previous)
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class EndpointStats:
+    """Latencies and errors of one endpoint"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    def summary(self, elapsed: float) -> dict:
+        latencies = np.array(self.latencies) * 1000
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies.size else (0.0, 0.0, 0.0)
+        return {
+            "requests": len(self.latencies),
+            "errors": self.errors,
+            "requests_per_second": round(len(self.latencies) / elapsed, 1),
+            "p50_ms": round(float(p50), 3),
+            "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3),
+        }
+
+
+class LoadTest:
+    """
+    Concurrent players each playing full 10-round games through the HTTP API,
+    via any httpx.AsyncClient (in-process ASGI transport or a real server).
+    Players are named loadtest_<n> from first_player on.
+    """
+
+    def __init__(self, client, players: int, games: int, think_time: float = 0.0, first_player: int = 0):
+        self.client = client
+        self.players = players
+        self.first_player = first_player
+        self.games = games
+        self.think_time = think_time
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self.completed_games = 0
+        self.failed_games = 0
+
+    async def _request(self, endpoint: str, path: str, body: dict) -> Optional[dict]:
+        stats = self.endpoints.setdefault(endpoint, EndpointStats())
+        start = time.perf_counter()
+        response = await self.client.post(path, json=body)
+        stats.latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            stats.errors += 1
+            return None
+        return response.json()
+
+    async def _play_game(self, player: int) -> bool:
+        game = await self._request("POST /api/games", "/api/games", {"player_name": f"loadtest_{player}"})
+        if game is None:
+            return False
+        answer = game["correct_answer"]
+        for round_number in range(1, 11):
+            if self.think_time:
+                await asyncio.sleep(self.think_time)
+            result = await self._request(
+                "POST /api/games/{session_id}/answer", f"/api/games/{game['session_id']}/answer",
+                {"player_answer": answer, "time_taken": 1.0, "round_number": round_number}
+            )
+            if result is None:
+                return False
+            answer = result.get("next_correct_answer")
+        return True
+
+    async def _player(self, player: int) -> None:
+        for _ in range(self.games):
+            try:
+                completed = await self._play_game(player)
+            except Exception:
+                completed = False
+            if completed:
+                self.completed_games += 1
+            else:
+                self.failed_games += 1
+
+    async def run(self) -> dict:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            self._player(player) for player in range(self.first_player, self.first_player + self.players)
+        ))
+        elapsed = time.perf_counter() - start
+        return {
+            "players": self.players,
+            "games_per_player": self.games,
+            "elapsed_seconds": round(elapsed, 3),
+            "completed_games": self.completed_games,
+            "failed_games": self.failed_games,
+            "games_per_second": round(self.completed_games / elapsed, 2),
+            "endpoints": {endpoint: stats.summary(elapsed) for endpoint, stats in self.endpoints.items()},
+        }
+
+
+def run_against(url: str, players: int, games: int, think_time: float = 0.0, first_player: int = 0) -> dict:
+    """Process pool entry point: one load generator against a running server"""
+    import httpx
+
+    async def run():
+        async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+            return await LoadTest(client, players, games, think_time, first_player).run()
+
+    return asyncio.run(run())
+
+
+# Baseline metrics where a higher value is better, everything else should not grow
+HIGHER_IS_BETTER = ("games_per_second", "requests_per_second")
+# Describe the run rather than measure it
+RUN_SETTINGS = ("players", "games_per_player", "requests", "completed_games")
+
+
+def compare_results(baseline: dict, results: dict) -> List[str]:
+    """One line per metric present in both runs, with the relative change"""
+
+    def flatten(values: dict, prefix: str = "") -> Dict[str, float]:
+        flat = {}
+        for key, value in values.items():
+            if isinstance(value, dict):
+                flat.update(flatten(value, f"{prefix}{key}."))
+            elif isinstance(value, (int, float)) and not isinstance(value, bool) and key not in RUN_SETTINGS:
+                flat[f"{prefix}{key}"] = value
+        return flat
+
+    before, after = flatten(baseline), flatten(results)
+    lines = []
+    for setting in ("players", "games_per_player"):
+        if baseline.get(setting) != results.get(setting):
+            lines.append(f"! {setting} differs: {baseline.get(setting)} -> {results.get(setting)}")
+    for metric in before.keys() & after.keys():
+        if before[metric] == after[metric]:
+            continue
+        change = (after[metric] - before[metric]) / before[metric] * 100 if before[metric] else float("inf")
+        better = (change > 0) == metric.endswith(HIGHER_IS_BETTER)
+        lines.append(f"{'+' if better else '-'} {metric}: {before[metric]} -> {after[metric]} ({change:+.1f}%)")
+    return sorted(lines, key=lambda line: line[2:])
+
+
+def write_baseline(path, results: dict) -> None:
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+
+def read_baseline(path) -> dict:
+    with open(path) as file:
+        return json.load(file)
@@ -0,0 +1,102 @@
+import json
+import random
+import time
+import tracemalloc
+import warnings
+from typing import Callable, Dict, List, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from game_logic import generate_question
+from models import AnswerResponse, GameSession, RoundData
+
+
+def _round_data(round_number: int) -> dict:
+    question, correct_answer, _, operation = generate_question(round_number, random.Random(round_number))
+    return {
+        "round_number": round_number,
+        "question": question,
+        "operation": operation,
+        "correct_answer": correct_answer,
+        "player_answer": correct_answer,
+        "is_correct": True,
+        "time_taken": 1.25,
+    }
+
+
+def benchmark_cases() -> Dict[str, Callable[[], object]]:
+    """The CPU work done on every request, one callable per case"""
+    rounds = [_round_data(round_number) for round_number in range(1, 11)]
+    round_model = RoundData(**rounds[0])
+    session_model = GameSession(player_id="bench", rounds_data=rounds)
+    answer = {
+        "is_correct": True, "correct_answer": 42, "current_round": 4, "score": 3, "is_game_completed": False,
+        "is_boss_level": False, "next_question": "6 × 7", "next_options": [42, 48, 36],
+        "next_correct_answer": 42, "next_is_boss_level": False,
+    }
+
+    cases: Dict[str, Callable[[], object]] = {}
+    for round_number in range(1, 11):
+        label = "boss" if round_number == 10 else f"round {round_number}"
+        cases[f"generate_question[{label}]"] = lambda round_number=round_number: generate_question(round_number)
+    cases.update({
+        "RoundData()": lambda: RoundData(**rounds[0]),
+        "RoundData.dict()": lambda: round_model.dict(),
+        "GameSession() with 10 rounds": lambda: GameSession(player_id="bench", rounds_data=rounds),
+        "GameSession.dict() with 10 rounds": lambda: session_model.dict(),
+        # What FastAPI does with a response_model return value
+        "AnswerResponse() to JSON": lambda: json.dumps(jsonable_encoder(AnswerResponse(**answer))),
+    })
+    return cases
+
+
+def measure(function: Callable[[], object], min_time: float = 0.2) -> Tuple[float, int]:
+    """Returns (operations per second, peak bytes allocated by one call)"""
+    def timed(loops: int) -> float:
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        return time.perf_counter() - start
+
+    # Calibrate the loop count to about min_time, then keep the best of 3 runs
+    loops = 1
+    while (elapsed := timed(loops)) < min_time / 10:
+        loops *= 10
+    loops = max(1, int(loops * min_time / elapsed))
+    best = min(timed(loops) for _ in range(3))
+
+    tracemalloc.start()
+    try:
+        function()
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return loops / best, peak - baseline
+
+
+def run_benchmarks(min_time: float = 0.2) -> Dict[str, dict]:
+    results = {}
+    with warnings.catch_warnings():
+        # .dict() is deprecated in Pydantic 2 but it is what the API calls
+        warnings.simplefilter("ignore", DeprecationWarning)
+        for name, function in benchmark_cases().items():
+            ops_per_second, peak_bytes = measure(function, min_time)
+            results[name] = {"ops_per_second": round(ops_per_second, 1), "peak_bytes": peak_bytes}
+    return results
+
+
+def find_regressions(baseline: Dict[str, dict], results: Dict[str, dict], threshold: float) -> List[str]:
+    """Cases more than threshold (a fraction) slower, or allocating more, than the baseline"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result["ops_per_second"] < before["ops_per_second"] * (1 - threshold):
+            regressions.append(f"{name}: {before['ops_per_second']:.0f} -> {result['ops_per_second']:.0f} ops/s")
+        if result["peak_bytes"] > before["peak_bytes"] * (1 + threshold):
+            regressions.append(f"{name}: {before['peak_bytes']} -> {result['peak_bytes']} peak bytes")
+    return regressions
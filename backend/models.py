@@ -6,12 +6,13 @@ import uuid
 
 class RoundData(BaseModel):
     round_number: int
-    question: str
+    question: Optional[str] = None  # Not stored for seeded sessions, recomputed from the seed
     operation: str
     correct_answer: int
     player_answer: Optional[int] = None
     is_correct: Optional[bool] = None
     time_taken: Optional[float] = None
+    difficulty: Optional[int] = None  # Difficulty tier picked for adaptive games
 
 
 class GameSession(BaseModel):
@@ -22,6 +23,8 @@ class GameSession(BaseModel):
     started_at: datetime = Field(default_factory=datetime.utcnow)
     completed_at: Optional[datetime] = None
     is_completed: bool = False
+    seed: Optional[int] = None  # Questions are derived from (seed, round_number) when set
+    adaptive: bool = False
     rounds_data: List[RoundData] = []
 
 
@@ -39,11 +42,33 @@ class Player(BaseModel):
 
 class StartGameRequest(BaseModel):
     player_name: str
+    seed: Optional[int] = Field(None, ge=0, lt=2**63)  # Replays a known question set, e.g. for load tests
+    prefetch: bool = False  # Return all 10 questions up front
+    adaptive: bool = False  # Pick question difficulty from the player's skill ratings
 
 
 class SubmitAnswerRequest(BaseModel):
-    player_answer: int
-    time_taken: float = 0.0
+    # Bounded to what the compact session layout stores: 32-bit answers and
+    # times in milliseconds
+    player_answer: int = Field(ge=-2**31, lt=2**31)
+    time_taken: float = Field(0.0, ge=0, le=86400)
+    round_number: Optional[int] = None  # Pins the answer to a round, duplicates get 409
+
+
+class BatchAnswer(SubmitAnswerRequest):
+    round_number: int  # Required in a batch: retries are matched by round
+
+
+class SubmitAnswersRequest(BaseModel):
+    answers: List[BatchAnswer]
+
+
+class QuestionData(BaseModel):
+    round_number: int
+    question: str
+    options: List[int]
+    correct_answer: int
+    is_boss_level: bool
 
 
 class GameResponse(BaseModel):
@@ -56,6 +81,7 @@ class GameResponse(BaseModel):
     correct_answer: int
     is_boss_level: bool
     is_completed: bool
+    questions: Optional[List[QuestionData]] = None
 
 
 class AnswerResponse(BaseModel):
@@ -71,6 +97,13 @@ class AnswerResponse(BaseModel):
     next_is_boss_level: Optional[bool] = None
 
 
+class BatchAnswerResponse(BaseModel):
+    results: List[AnswerResponse]
+    current_round: int
+    score: int
+    is_game_completed: bool
+
+
 class PlayerStats(BaseModel):
     name: str
     games_played: int
@@ -78,4 +111,35 @@ class PlayerStats(BaseModel):
     best_score: int
     boss_levels_completed: int
     perfect_games: int
-    average_score: float
\ No newline at end of file
+    average_score: float
+
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    player_id: str
+    name: str
+    best_score: int
+    total_score: int
+
+
+class LeaderboardResponse(BaseModel):
+    period: Optional[str] = None  # Set for daily/weekly leaderboards
+    top: List[LeaderboardEntry]
+    player: Optional[LeaderboardEntry] = None
+    total_players: int
+
+
+class SkillBreakdown(BaseModel):
+    key: str  # Operation symbol or round number
+    attempts: int
+    accuracy: float
+    latency_p50: float
+    latency_p90: float
+    latency_p99: float
+
+
+class PlayerAnalytics(BaseModel):
+    player_id: str
+    rounds_played: int
+    by_operation: List[SkillBreakdown]
+    by_round: List[SkillBreakdown]
\ No newline at end of file
@@ -0,0 +1,91 @@
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from storage import PlayerStore
+
+
+# What the by-name lookup returns, enough to start a game for the player
+FIELDS = ("player_id", "name", "games_played", "best_score")
+
+
+def _summary(player: dict) -> dict:
+    return {field: player.get(field, 0) for field in FIELDS}
+
+
+class PlayerNameCache:
+    """
+    Bounded LRU/TTL cache of player lookups by name in front of a PlayerStore.
+    Names nobody plays under are cached as well, for negative_ttl_seconds only,
+    since another worker may create the player meanwhile. Entries are updated
+    when a player is created or completes a game, and through CacheSync for the
+    changes made by other workers.
+    """
+
+    def __init__(self, store: PlayerStore, max_entries: int = 10000, ttl_seconds: float = 300.0,
+                 negative_ttl_seconds: float = 5.0):
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        # name -> (player summary or None when there is no such player, expiry)
+        self._entries: "OrderedDict[str, Tuple[Optional[dict], float]]" = OrderedDict()
+        self.stats = {
+            "hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "entries": 0,
+        }
+
+    def _store(self, name: str, player: Optional[dict]) -> None:
+        ttl_seconds = self.ttl_seconds if player is not None else self.negative_ttl_seconds
+        self._entries[name] = (player, time.monotonic() + ttl_seconds)
+        self._entries.move_to_end(name)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+        self.stats["entries"] = len(self._entries)
+
+    async def get(self, name: str) -> Optional[dict]:
+        """player_id, name, games_played and best_score of the player, None when there is none"""
+        entry = self._entries.get(name)
+        if entry is not None:
+            player, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(name)
+                self.stats["hits" if player is not None else "negative_hits"] += 1
+                return player
+            del self._entries[name]
+            self.stats["expirations"] += 1
+
+        self.stats["misses"] += 1
+        player = await self.store.get_by_name(name)
+        player = _summary(player) if player else None
+        # A player created while the store was read is at least as fresh
+        if player is not None or name not in self._entries:
+            self._store(name, player)
+        return player
+
+    async def get_or_create(self, player: dict) -> dict:
+        """
+        Like get, but a name that is not cached as a player goes straight to the
+        store's get-or-create, one round-trip whether or not the player exists
+        """
+        entry = self._entries.get(player["name"])
+        if entry is not None and entry[0] is not None and entry[1] > time.monotonic():
+            self._entries.move_to_end(player["name"])
+            self.stats["hits"] += 1
+            return entry[0]
+
+        self.stats["misses"] += 1
+        stored = _summary(await self.store.get_or_create(player))
+        self._store(player["name"], stored)
+        return stored
+
+    def refresh(self, players: List[dict]) -> None:
+        """Take the newer statistics of players that are cached, as read from the store"""
+        for player in players:
+            if player["name"] in self._entries:
+                self._store(player["name"], _summary(player))
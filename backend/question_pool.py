@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from game_logic import generate_question, generate_questions
+
+
+class QuestionPool:
+    """
+    Precomputed questions per round. When a round's pool drops below
+    low_water questions, one NumPy batch is generated in a worker thread and
+    appended, so the request path only pops. A pool that still runs dry
+    serves scalar questions until the refill lands.
+    """
+
+    def __init__(self, batch_size: int = 1000, rounds: int = 10, low_water: Optional[int] = None):
+        self.batch_size = batch_size
+        self.rounds = rounds
+        self.low_water = batch_size // 4 if low_water is None else low_water
+        self._pools: Dict[int, deque] = {round_number: deque() for round_number in range(1, rounds + 1)}
+        self._refills: Dict[int, asyncio.Task] = {}
+        self.stats = {"served": 0, "refills": 0, "scalar_fallbacks": 0}
+
+    def refill(self, round_number: int) -> None:
+        self._pools[round_number].extend(generate_questions(round_number, self.batch_size))
+        self.stats["refills"] += 1
+
+    def fill(self) -> None:
+        """Fill every round's pool, e.g. at startup"""
+        for round_number, pool in self._pools.items():
+            if not pool:
+                self.refill(round_number)
+
+    async def _refill_in_background(self, round_number: int) -> None:
+        try:
+            await asyncio.to_thread(self.refill, round_number)
+        except Exception as e:
+            logging.error(f"Error refilling question pool of round {round_number}: {str(e)}")
+        finally:
+            del self._refills[round_number]
+
+    def _schedule_refill(self, round_number: int) -> None:
+        if round_number in self._refills:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop to stall (e.g. benchmarks), refill in place
+            self.refill(round_number)
+            return
+        self._refills[round_number] = loop.create_task(self._refill_in_background(round_number))
+
+    def pop(self, round_number: int) -> Tuple[str, int, List[int], str]:
+        pool = self._pools[round_number]
+        if len(pool) <= self.low_water:
+            self._schedule_refill(round_number)
+        self.stats["served"] += 1
+        if not pool:
+            self.stats["scalar_fallbacks"] += 1
+            return generate_question(round_number)
+        return pool.popleft()
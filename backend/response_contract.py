@@ -0,0 +1,57 @@
+from typing import List, Tuple
+
+
+async def scripted_responses(client, seed: int = 20240601) -> List[Tuple[str, bytes]]:
+    """
+    Plays one seeded game through every game endpoint, including replayed and
+    rejected answers, and returns (request, raw body) pairs. The random session
+    ids are replaced, so the bodies of two runs can be compared byte for byte.
+    """
+    responses = []
+    session_ids = []
+
+    async def call(method: str, path: str, body: dict = None) -> dict:
+        response = await client.request(method, path, json=body)
+        data = response.json()
+        if isinstance(data, dict) and "session_id" in data and data["session_id"] not in session_ids:
+            session_ids.append(data["session_id"])
+        responses.append((f"{method} {path} {response.status_code}", response.content))
+        return data
+
+    game = await call("POST", "/api/games", {"player_name": "contract", "seed": seed, "prefetch": True})
+    session_path = f"/api/games/{game['session_id']}"
+    questions = game["questions"]
+    await call("GET", session_path)
+
+    # Single answers, right and wrong, then a duplicate
+    for round_number in range(1, 4):
+        answer = questions[round_number - 1]["correct_answer"] + (round_number % 2)
+        await call("POST", f"{session_path}/answer", {"player_answer": answer, "time_taken": 1.5,
+                                                      "round_number": round_number})
+    await call("POST", f"{session_path}/answer", {"player_answer": 0, "round_number": 3})
+
+    # A batch, then a retry overlapping it that finishes the game
+    await call("POST", f"{session_path}/answers", {"answers": [
+        {"player_answer": questions[index]["correct_answer"], "round_number": index + 1} for index in range(3, 7)
+    ]})
+    await call("POST", f"{session_path}/answers", {"answers": [
+        {"player_answer": questions[index]["correct_answer"] - 1, "round_number": index + 1} for index in range(5, 10)
+    ]})
+    await call("GET", session_path)
+    await call("POST", f"{session_path}/answer", {"player_answer": 0})
+
+    # A seeded game without prefetch, answered round by round
+    game = await call("POST", "/api/games", {"player_name": "contract", "seed": seed + 1})
+    answer = game["correct_answer"]
+    for round_number in range(1, 11):
+        result = await call("POST", f"/api/games/{game['session_id']}/answer", {"player_answer": answer})
+        answer = result.get("next_correct_answer")
+    await call("GET", "/api/games/missing")
+
+    normalized = []
+    for request, body in responses:
+        for index, session_id in enumerate(session_ids):
+            body = body.replace(session_id.encode(), f"<session {index}>".encode())
+            request = request.replace(session_id, f"<session {index}>")
+        normalized.append((request, body))
+    return normalized
@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from leaderboard import Leaderboard
+from storage import RollupStore
+
+
+# Time windows and how a completion time maps to the window's period key
+WINDOWS = {
+    "daily": lambda moment: moment.strftime("%Y-%m-%d"),
+    "weekly": lambda moment: moment.strftime("%G-W%V"),
+}
+
+
+class WindowedLeaderboards:
+    """
+    Daily and weekly leaderboards built from per-window rollups. Every completed
+    game is folded into one rollup document per window and player, and the
+    current period of each window is mirrored in an in-memory Leaderboard, so
+    reads cost O(top-N) whatever the number of games. When a period ends the
+    in-memory board is replaced by the next period's on first use.
+    """
+
+    def __init__(self, store: RollupStore):
+        self.store = store
+        self._boards: Dict[str, Leaderboard] = {}
+        self._periods: Dict[str, str] = {}
+        self._locks = {window: asyncio.Lock() for window in WINDOWS}
+
+    async def _current_board(self, window: str, now: datetime) -> Leaderboard:
+        period = WINDOWS[window](now)
+        if self._periods.get(window) != period:
+            async with self._locks[window]:
+                if self._periods.get(window) != period:
+                    rollups = await self.store.list(window, period)
+                    board = Leaderboard()
+                    board.load(rollups)
+                    self._boards[window] = board
+                    self._periods[window] = period
+        return self._boards[window]
+
+    async def record(self, player_id: str, name: str, score: int, completed_at: datetime) -> None:
+        """Fold a completed game into the rollups of every window"""
+        # Load the boards first so a freshly loaded board does not already hold this game
+        boards = {window: await self._current_board(window, completed_at) for window in WINDOWS}
+        await self.store.record(
+            [(window, period_of(completed_at)) for window, period_of in WINDOWS.items()], player_id, name, score
+        )
+
+        for board in boards.values():
+            previous = board.player(player_id)
+            if previous is None:
+                board.update(player_id, name, score, score)
+            else:
+                board.update(player_id, name, max(previous["best_score"], score), previous["total_score"] + score)
+
+    async def refresh(self, player_ids: List[str]) -> None:
+        """Reload the entries of these players on the in-memory boards, e.g. after other workers wrote them"""
+        now = datetime.utcnow()
+        for window, period_of in WINDOWS.items():
+            period = period_of(now)
+            if self._periods.get(window) != period:
+                # Loaded fresh on first use
+                continue
+            board = self._boards[window]
+            for rollup in await self.store.find_many(window, period, player_ids):
+                board.update(rollup["player_id"], rollup["name"], rollup["best_score"], rollup["total_score"])
+
+    async def top(self, window: str, limit: int, player_id: Optional[str] = None,
+                  period: Optional[str] = None):
+        """
+        Returns (period, top entries, player's entry, number of players). Past
+        periods are read straight from the rollup store.
+        """
+        now = datetime.utcnow()
+        if period is None or period == WINDOWS[window](now):
+            board = await self._current_board(window, now)
+            return (self._periods[window], board.top(limit),
+                    board.player(player_id) if player_id else None, len(board))
+
+        rollups = await self.store.top(window, period, limit)
+        entries = []
+        for index, rollup in enumerate(rollups):
+            previous = entries[-1] if entries else None
+            tied = previous and (previous["best_score"], previous["total_score"]) == (
+                rollup["best_score"], rollup["total_score"])
+            entries.append(self._entry(previous["rank"] if tied else index + 1, rollup))
+
+        player = None
+        if player_id:
+            rollup = await self.store.find(window, period, player_id)
+            player = await self._ranked(window, period, rollup) if rollup else None
+        return period, entries, player, await self.store.count(window, period)
+
+    async def _ranked(self, window: str, period: str, rollup: dict) -> dict:
+        # Players with the same scores share a rank, as in Leaderboard
+        ahead = await self.store.count_ahead(window, period, rollup["best_score"], rollup["total_score"])
+        return self._entry(ahead + 1, rollup)
+
+    @staticmethod
+    def _entry(rank: int, rollup: dict) -> dict:
+        return {
+            "rank": rank,
+            "player_id": rollup["player_id"],
+            "name": rollup["name"],
+            "best_score": rollup["best_score"],
+            "total_score": rollup["total_score"],
+        }
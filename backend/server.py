@@ -1,32 +1,233 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import math
+import asyncio
 import logging
 from pathlib import Path
+from contextlib import asynccontextmanager
 from datetime import datetime
+from typing import List, Optional
 from models import (
-    GameSession, Player, StartGameRequest, SubmitAnswerRequest,
-    GameResponse, AnswerResponse, PlayerStats, RoundData
+    GameSession, Player, StartGameRequest, SubmitAnswerRequest, SubmitAnswersRequest,
+    GameResponse, AnswerResponse, BatchAnswerResponse, PlayerStats, RoundData, QuestionData,
+    LeaderboardResponse, PlayerAnalytics
 )
-from game_logic import generate_question, calculate_player_stats
+from game_logic import (
+    generate_question, calculate_player_stats, new_seed, question_for_round
+)
+from storage import Stores, create_stores
+from connection import create_client
+from cache_sync import CacheSync
+from archive import SessionArchive
+from export import FORMATS, export_sessions, export_window, naive_utc, parquet_available
+from session_cache import SessionCache
+from question_pool import QuestionPool
+from leaderboard import Leaderboard
+from player_names import PlayerNameCache
+from rollups import WindowedLeaderboards, WINDOWS
+from analytics import AnalyticsCache, calculate_player_analytics
+from skill import SkillRatings
+from tracing import RequestMetricsMiddleware, Tracer, trace_stores
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Storage backend: mongo (MongoDB through Motor) or memory (in-process, for benchmarks and tests).
+# The client is created per worker process on startup.
+storage_backend = os.environ.get('STORAGE_BACKEND', 'mongo')
+client = None
+db = None
+session_archive = None
+stores = None
+
+# Completed sessions older than ARCHIVE_AFTER_DAYS move to compressed archive
+# chunks in the background, ARCHIVE_AFTER_DAYS=0 keeps everything in game_sessions
+archive_after_days = float(os.environ.get('ARCHIVE_AFTER_DAYS', '0'))
+
+# Number of worker processes, as given to uvicorn/gunicorn. With several workers
+# the in-process caches are kept in step through CacheSync.
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+cache_sync_interval = float(os.environ.get('CACHE_SYNC_INTERVAL', '1.0'))
+
+# Optional in-process cache of active game sessions: off, write-through or write-behind.
+# With several workers it needs a proxy that routes every session to one worker
+# (SESSION_AFFINITY=1), otherwise a worker could serve a stale copy.
+session_cache_mode = os.environ.get('SESSION_CACHE_MODE', 'off')
+session_affinity = os.environ.get('SESSION_AFFINITY', '0') == '1'
+
+# Request latency histograms, plus store and question generation spans for a
+# TRACE_SAMPLE_RATE fraction of the requests (0 turns spans off)
+tracer = Tracer(sample_rate=float(os.environ.get('TRACE_SAMPLE_RATE', '0.1')))
+
+# Opt-in fast path for the game endpoints: the response models the handlers
+# build are rendered with orjson, skipping FastAPI's second validation against
+# response_model and its JSON encoder. The output is byte-for-byte the same
+# (cli.py bench-json).
+fast_json = os.environ.get('FAST_JSON', '0') == '1'
+if fast_json:
+    try:
+        import orjson  # noqa: F401
+    except ImportError:
+        logging.warning("FAST_JSON needs orjson, responses take the regular path")
+        fast_json = False
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_app()
+    yield
+    await stop_app()
+
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+
+# The default handler echoes the input of every error, which JSON cannot carry
+# when a client sends NaN or Infinity
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    errors = [
+        {**error, "input": str(error["input"])}
+        if isinstance(error.get("input"), float) and not math.isfinite(error["input"]) else error
+        for error in exc.errors()
+    ]
+    return await request_validation_exception_handler(request, RequestValidationError(errors))
+
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# Optional pools of pregenerated questions, QUESTION_POOL_SIZE=0 generates inline
+question_pool_size = int(os.environ.get('QUESTION_POOL_SIZE', '0'))
+question_pool = QuestionPool(batch_size=question_pool_size) if question_pool_size > 0 else None
+
+
+def use_stores(new_stores: Stores, cache_mode: str = None):
+    """
+    Point the API at a set of stores and rebuild everything derived from them.
+    Called on startup, and by benchmarks beforehand to run the handlers on a
+    scratch backend.
+    """
+    global stores, session_cache, leaderboard, windowed_leaderboards, analytics_cache, skill_ratings, cache_sync
+    global player_names
+    stores = trace_stores(new_stores)
+    cache_mode = cache_mode or session_cache_mode
+    if cache_mode != 'off' and workers > 1 and not session_affinity:
+        logging.warning("The session cache needs SESSION_AFFINITY=1 with several workers, it is turned off")
+        cache_mode = 'off'
+    session_cache = None
+    if cache_mode != 'off':
+        session_cache = SessionCache(
+            stores.games,
+            mode=cache_mode,
+            max_entries=int(os.environ.get('SESSION_CACHE_SIZE', '10000')),
+            ttl_seconds=float(os.environ.get('SESSION_CACHE_TTL', '900')),
+            flush_interval=float(os.environ.get('SESSION_CACHE_FLUSH_INTERVAL', '1.0'))
+        )
+    # Player lookups by name, the first read of nearly every game
+    player_names = PlayerNameCache(
+        stores.players,
+        max_entries=int(os.environ.get('PLAYER_NAME_CACHE_SIZE', '10000')),
+        ttl_seconds=float(os.environ.get('PLAYER_NAME_CACHE_TTL', '300')),
+        negative_ttl_seconds=float(os.environ.get('PLAYER_NAME_CACHE_NEGATIVE_TTL', '5'))
+    )
+    # All-time leaderboard, loaded from the player store on startup and kept up to date in memory
+    leaderboard = Leaderboard()
+    # Daily and weekly leaderboards from per-window rollups
+    windowed_leaderboards = WindowedLeaderboards(stores.rollups)
+    # Per-player analytics, invalidated whenever the player completes a game
+    analytics_cache = AnalyticsCache()
+    # Per-operation skill ratings for adaptive games
+    skill_ratings = SkillRatings(
+        stores.players,
+        target_success=float(os.environ.get('ADAPTIVE_TARGET_SUCCESS', '0.7')),
+        flush_interval=float(os.environ.get('SKILL_FLUSH_INTERVAL', '30')),
+        max_players=int(os.environ.get('SKILL_MAX_PLAYERS', '100000'))
+    )
+    # Changes made by the other workers
+    cache_sync = None
+    if workers > 1:
+        cache_sync = CacheSync(stores.players, interval=cache_sync_interval)
+        cache_sync.subscribe(refresh_player_caches)
+
+
+async def refresh_player_caches(players: List[dict]):
+    """Take the stored totals of players another worker may have changed"""
+    for player in players:
+        leaderboard.update(player["player_id"], player["name"], player["best_score"], player["total_score"])
+        analytics_cache.invalidate(player["player_id"])
+        skill_ratings.forget(player["player_id"])
+    player_names.refresh(players)
+    await windowed_leaderboards.refresh([player["player_id"] for player in players])
+
+
+def respond(response):
+    if fast_json:
+        return ORJSONResponse(response.model_dump())
+    return response
+
+
+def draw_question(round_number: int):
+    with tracer.span("generate_question"):
+        if question_pool:
+            return question_pool.pop(round_number)
+        return generate_question(round_number)
+
+
+def seeded_question(seed: int, round_number: int):
+    with tracer.span("generate_question"):
+        return question_for_round(seed, round_number)
+
+
+def adaptive_question(player_id: str, round_number: int):
+    with tracer.span("generate_question"):
+        return skill_ratings.next_question(player_id, round_number)
+
+
+def session_question(game_session: dict, round_number: int):
+    """
+    Question of a round: recomputed from the seed, or read from rounds_data for
+    sessions without one (options are not stored for those)
+    """
+    if game_session.get("seed") is not None:
+        return seeded_question(game_session["seed"], round_number)
+    round_data = game_session["rounds_data"][round_number - 1]
+    return round_data["question"], round_data["correct_answer"], [], round_data["operation"]
+
+
+async def load_game_session(session_id: str):
+    if session_cache:
+        return await session_cache.get(session_id)
+    return await stores.games.get(session_id)
+
+
+async def update_game_session(guard: dict, update: dict, flush: bool = False):
+    """
+    Apply an update to the session matching guard, returns the updated session
+    (at least its score) or None when the guard no longer matches
+    """
+    if session_cache:
+        # Completed games are always flushed before the result is returned
+        return await session_cache.update(guard, update, flush=flush)
+    return await stores.games.update(guard, update)
+
+
+async def record_completed_game(player_id: str, score: int):
+    # Update player statistics in a single atomic write
+    player = await stores.players.record_game(player_id, score)
+    analytics_cache.invalidate(player_id)
+    if player:
+        leaderboard.update(player_id, player["name"], player["best_score"], player["total_score"])
+        player_names.refresh([{**player, "player_id": player_id}])
+        await windowed_leaderboards.record(player_id, player["name"], score, datetime.utcnow())
+
 
 # Health check endpoint
 @api_router.get("/")
@@ -34,39 +235,74 @@ async def root():
     return {"message": "Add Nivin Add! Game API is running"}
 
 
+# Readiness check: the warm-up is done and the database answers. The health
+# check above only says that the process is up.
+@api_router.get("/ready")
+async def readiness():
+    if warm_up_task is None or not warm_up_task.done():
+        raise HTTPException(status_code=503, detail="Warming up")
+    if db is not None:
+        try:
+            await db.command("ping")
+        except Exception as e:
+            logging.error(f"Readiness check failed: {str(e)}")
+            raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"ready": True}
+
+
 # Start new game session
 @api_router.post("/games", response_model=GameResponse)
 async def start_game(request: StartGameRequest):
+    # Adaptive questions depend on the player's ratings at the time they are
+    # asked, they can be neither replayed from a seed nor sent up front
+    if request.adaptive and (request.seed is not None or request.prefetch):
+        raise HTTPException(status_code=400, detail="Adaptive games cannot be combined with seed or prefetch")
     try:
-        # Check if player exists, if not create new player
-        player = await db.players.find_one({"name": request.player_name})
+        # Get the player or create it, atomically so that concurrent first
+        # games under one name share a single player
+        new_player = Player(name=request.player_name)
+        player = await player_names.get_or_create(new_player.dict())
+        player_id = player["player_id"]
+        is_new_player = player_id == new_player.player_id
+        if is_new_player:
+            leaderboard.update(player_id, new_player.name, 0, 0)
         
-        if not player:
-            new_player = Player(name=request.player_name)
-            await db.players.insert_one(new_player.dict())
-            player_id = new_player.player_id
-        else:
-            player_id = player["player_id"]
-        
-        # Create new game session
-        game_session = GameSession(player_id=player_id)
+        # Create new game session. Pooled and adaptive questions cannot be
+        # replayed from a seed, so those sessions store them in rounds_data.
+        seed = request.seed
+        if seed is None and (request.prefetch or not question_pool) and not request.adaptive:
+            seed = new_seed()
+        game_session = GameSession(player_id=player_id, seed=seed, adaptive=request.adaptive)
         
         # Generate first question
-        question, correct_answer, options, operation = generate_question(1)
-        
-        # Add first round data
-        round_data = RoundData(
-            round_number=1,
-            question=question,
-            operation=operation,
-            correct_answer=correct_answer
-        )
-        game_session.rounds_data = [round_data]
+        if seed is not None:
+            question, correct_answer, options, operation = seeded_question(seed, 1)
+        else:
+            difficulty = None
+            if request.adaptive:
+                if not skill_ratings.is_loaded(player_id):
+                    skill_ratings.load(player_id, None if is_new_player else await stores.players.get_skill(player_id))
+                (question, correct_answer, options, operation), difficulty = adaptive_question(player_id, 1)
+            else:
+                question, correct_answer, options, operation = draw_question(1)
+            
+            # Add first round data
+            round_data = RoundData(
+                round_number=1,
+                question=question,
+                operation=operation,
+                correct_answer=correct_answer,
+                difficulty=difficulty
+            )
+            game_session.rounds_data = [round_data]
         
         # Save game session
-        await db.game_sessions.insert_one(game_session.dict())
+        session_document = game_session.dict()
+        await stores.games.insert(session_document)
+        if session_cache:
+            session_cache.put(session_document)
         
-        return GameResponse(
+        response = GameResponse(
             session_id=game_session.session_id,
             current_round=1,
             score=0,
@@ -77,6 +313,22 @@ async def start_game(request: StartGameRequest):
             is_completed=False
         )
         
+        # The whole game up front. The server keeps only the seed and
+        # recomputes these questions when the answers come back.
+        if request.prefetch:
+            response.questions = []
+            for round_number in range(1, 11):
+                round_question, round_answer, round_options, _ = seeded_question(seed, round_number)
+                response.questions.append(QuestionData(
+                    round_number=round_number,
+                    question=round_question,
+                    options=round_options,
+                    correct_answer=round_answer,
+                    is_boss_level=round_number == 10
+                ))
+        
+        return respond(response)
+        
     except Exception as e:
         logging.error(f"Error starting game: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to start game")
@@ -87,7 +339,7 @@ async def start_game(request: StartGameRequest):
 async def submit_answer(session_id: str, request: SubmitAnswerRequest):
     try:
         # Get game session
-        game_session = await db.game_sessions.find_one({"session_id": session_id})
+        game_session = await load_game_session(session_id)
         if not game_session:
             raise HTTPException(status_code=404, detail="Game session not found")
         
@@ -95,78 +347,100 @@ async def submit_answer(session_id: str, request: SubmitAnswerRequest):
             raise HTTPException(status_code=400, detail="Game already completed")
         
         current_round = game_session["current_round"]
-        current_round_data = game_session["rounds_data"][current_round - 1]
+        if request.round_number is not None and request.round_number < current_round:
+            raise HTTPException(status_code=409, detail="Round already answered")
+        if request.round_number is not None and request.round_number > current_round:
+            raise HTTPException(status_code=409, detail="Round not reached")
         
-        # Check if answer is correct
-        is_correct = request.player_answer == current_round_data["correct_answer"]
-        score = game_session["score"] + (1 if is_correct else 0)
+        seed = game_session.get("seed")
+        _, correct_answer, _, operation = session_question(game_session, current_round)
         
-        # Update round data
-        current_round_data["player_answer"] = request.player_answer
-        current_round_data["is_correct"] = is_correct
-        current_round_data["time_taken"] = request.time_taken
+        # Check if answer is correct
+        is_correct = request.player_answer == correct_answer
         
         # Check if game is completed
         is_game_completed = current_round >= 10
         next_round = current_round + 1 if not is_game_completed else current_round
         
+        update_data = {
+            "current_round": next_round,
+            "is_completed": is_game_completed
+        }
+        update = {"$set": update_data, "$inc": {"score": 1 if is_correct else 0}}
+        
         # Prepare next question if not completed
         next_question = None
         next_options = None
         next_correct_answer = None
+        skill_change = None
         
-        if not is_game_completed:
-            next_question, next_correct_answer, next_options, next_operation = generate_question(next_round)
-            next_round_data = RoundData(
-                round_number=next_round,
-                question=next_question,
-                operation=next_operation,
-                correct_answer=next_correct_answer
+        if seed is not None:
+            # Only answered rounds are stored, questions come from the seed
+            answered_round = RoundData(
+                round_number=current_round,
+                operation=operation,
+                correct_answer=correct_answer,
+                player_answer=request.player_answer,
+                is_correct=is_correct,
+                time_taken=request.time_taken
             )
-            game_session["rounds_data"].append(next_round_data.dict())
-        
-        # Update game session
-        update_data = {
-            "current_round": next_round,
-            "score": score,
-            "rounds_data": game_session["rounds_data"],
-            "is_completed": is_game_completed
-        }
+            update["$push"] = {"rounds_data": answered_round.dict(exclude={"question"})}
+            if not is_game_completed:
+                next_question, next_correct_answer, next_options, _ = seeded_question(seed, next_round)
+        else:
+            # Only the answered round is written, never the whole rounds_data array
+            round_path = f"rounds_data.{current_round - 1}"
+            update_data[f"{round_path}.player_answer"] = request.player_answer
+            update_data[f"{round_path}.is_correct"] = is_correct
+            update_data[f"{round_path}.time_taken"] = request.time_taken
+            
+            # Adaptive games rate the answer before picking the next question,
+            # the change is reverted if the write below loses a race
+            if game_session.get("adaptive"):
+                difficulty = game_session["rounds_data"][current_round - 1]["difficulty"]
+                await skill_ratings.ensure_loaded(game_session["player_id"])
+                skill_change = skill_ratings.record(game_session["player_id"], operation, difficulty, is_correct)
+            
+            if not is_game_completed:
+                next_difficulty = None
+                if game_session.get("adaptive"):
+                    (next_question, next_correct_answer, next_options, next_operation), next_difficulty = \
+                        adaptive_question(game_session["player_id"], next_round)
+                else:
+                    next_question, next_correct_answer, next_options, next_operation = draw_question(next_round)
+                next_round_data = RoundData(
+                    round_number=next_round,
+                    question=next_question,
+                    operation=next_operation,
+                    correct_answer=next_correct_answer,
+                    difficulty=next_difficulty
+                )
+                # MongoDB rejects a $push to rounds_data alongside the positional $set
+                # above, so the next round is appended by index instead. The
+                # current_round guard below pins that index to the end of the array.
+                update_data[f"rounds_data.{current_round}"] = next_round_data.dict()
         
         if is_game_completed:
             update_data["completed_at"] = datetime.utcnow()
-            
-            # Update player statistics
-            player = await db.players.find_one({"player_id": game_session["player_id"]})
-            if player:
-                player_updates = {
-                    "games_played": player.get("games_played", 0) + 1,
-                    "total_score": player.get("total_score", 0) + score,
-                    "last_played": datetime.utcnow()
-                }
-                
-                if score > player.get("best_score", 0):
-                    player_updates["best_score"] = score
-                
-                if score == 10:  # Perfect game
-                    player_updates["perfect_games"] = player.get("perfect_games", 0) + 1
-                
-                if score >= 9:  # Completed boss level successfully
-                    player_updates["boss_levels_completed"] = player.get("boss_levels_completed", 0) + 1
-                
-                await db.players.update_one(
-                    {"player_id": game_session["player_id"]},
-                    {"$set": player_updates}
-                )
         
-        await db.game_sessions.update_one(
-            {"session_id": session_id},
-            {"$set": update_data}
-        )
+        # The filter makes the round transition atomic: when two answers race
+        # for the same round only the first one matches and gets scored.
+        guard = {"session_id": session_id, "current_round": current_round, "is_completed": False}
+        updated_session = await update_game_session(guard, update, flush=is_game_completed)
+        if not updated_session:
+            if skill_change is not None:
+                skill_ratings.revert(game_session["player_id"], operation, skill_change)
+            # Rounds only move forward, so another answer took this one
+            raise HTTPException(status_code=409, detail="Round already answered")
+        
+        score = updated_session["score"]
+        
+        if is_game_completed:
+            await record_completed_game(game_session["player_id"], score)
         
         response = AnswerResponse(
             is_correct=is_correct,
-            correct_answer=current_round_data["correct_answer"],
+            correct_answer=correct_answer,
             current_round=next_round if not is_game_completed else current_round,
             score=score,
             is_game_completed=is_game_completed,
@@ -180,7 +454,7 @@ async def submit_answer(session_id: str, request: SubmitAnswerRequest):
             response.next_correct_answer = next_correct_answer
             response.next_is_boss_level = next_round == 10
         
-        return response
+        return respond(response)
         
     except HTTPException:
         raise
@@ -189,27 +463,162 @@ async def submit_answer(session_id: str, request: SubmitAnswerRequest):
         raise HTTPException(status_code=500, detail="Failed to submit answer")
 
 
+def answered_round_results(game_session: dict, round_numbers: List[int]) -> List[AnswerResponse]:
+    """Rebuild the results of rounds that were already answered from rounds_data"""
+    answered = {
+        round_data["round_number"]: round_data
+        for round_data in game_session["rounds_data"]
+        if round_data.get("is_correct") is not None
+    }
+    results = []
+    for round_number in round_numbers:
+        round_data = answered[round_number]
+        results.append(AnswerResponse(
+            is_correct=round_data["is_correct"],
+            correct_answer=round_data["correct_answer"],
+            current_round=min(round_number + 1, 10),
+            score=sum(1 for number, data in answered.items() if number <= round_number and data["is_correct"]),
+            is_game_completed=round_number == 10,
+            is_boss_level=round_number == 10
+        ))
+    return results
+
+
+# Submit answers for several rounds at once, e.g. a whole prefetched game or
+# answers queued while offline. Idempotent per round: rounds that were already
+# answered return their stored result, so a client can retry after a timeout.
+@api_router.post("/games/{session_id}/answers", response_model=BatchAnswerResponse)
+async def submit_answers(session_id: str, request: SubmitAnswersRequest):
+    try:
+        game_session = await load_game_session(session_id)
+        if not game_session:
+            raise HTTPException(status_code=404, detail="Game session not found")
+        
+        seed = game_session.get("seed")
+        if seed is None:
+            raise HTTPException(status_code=400, detail="Game session does not support batch answers")
+        
+        if not request.answers:
+            raise HTTPException(status_code=400, detail="No answers submitted")
+        
+        # Rounds answered already are replayed from the stored results
+        current_round = game_session["current_round"]
+        answered_count = len(game_session["rounds_data"])
+        round_numbers = [answer.round_number for answer in request.answers]
+        
+        if round_numbers != list(range(round_numbers[0], round_numbers[0] + len(round_numbers))):
+            raise HTTPException(status_code=400, detail="Answers must be for consecutive rounds in order")
+        if round_numbers[0] < 1 or round_numbers[-1] > 10:
+            raise HTTPException(status_code=400, detail="Answers must be for rounds 1 to 10")
+        if round_numbers[0] > answered_count + 1:
+            raise HTTPException(status_code=409, detail="Round not reached")
+        
+        replayed_rounds = [number for number in round_numbers if number <= answered_count]
+        new_answers = [
+            (number, answer) for number, answer in zip(round_numbers, request.answers)
+            if number > answered_count
+        ]
+        results = answered_round_results(game_session, replayed_rounds)
+        
+        if not new_answers:
+            return respond(BatchAnswerResponse(
+                results=results,
+                current_round=current_round,
+                score=game_session["score"],
+                is_game_completed=game_session["is_completed"]
+            ))
+        
+        # Score every new answer against the questions recomputed from the seed
+        answered_rounds = []
+        score = game_session["score"]
+        for round_number, answer in new_answers:
+            _, correct_answer, _, operation = seeded_question(seed, round_number)
+            is_correct = answer.player_answer == correct_answer
+            score += 1 if is_correct else 0
+            answered_rounds.append(RoundData(
+                round_number=round_number,
+                operation=operation,
+                correct_answer=correct_answer,
+                player_answer=answer.player_answer,
+                is_correct=is_correct,
+                time_taken=answer.time_taken
+            ).dict(exclude={"question"}))
+            results.append(AnswerResponse(
+                is_correct=is_correct,
+                correct_answer=correct_answer,
+                current_round=min(round_number + 1, 10),
+                score=score,
+                is_game_completed=round_number == 10,
+                is_boss_level=round_number == 10
+            ))
+        
+        last_round = round_numbers[-1]
+        is_game_completed = last_round >= 10
+        update_data = {
+            "current_round": last_round + 1 if not is_game_completed else last_round,
+            "is_completed": is_game_completed
+        }
+        if is_game_completed:
+            update_data["completed_at"] = datetime.utcnow()
+        
+        # One guarded write for all new rounds
+        guard = {"session_id": session_id, "current_round": current_round, "is_completed": False}
+        update = {
+            "$set": update_data,
+            "$inc": {"score": score - game_session["score"]},
+            "$push": {"rounds_data": {"$each": answered_rounds}}
+        }
+        updated_session = await update_game_session(guard, update, flush=is_game_completed)
+        if not updated_session:
+            # A concurrent retry may have stored these rounds in the meantime
+            game_session = await load_game_session(session_id)
+            if len(game_session["rounds_data"]) < last_round:
+                raise HTTPException(status_code=409, detail="Round already answered")
+            return respond(BatchAnswerResponse(
+                results=answered_round_results(game_session, round_numbers),
+                current_round=game_session["current_round"],
+                score=game_session["score"],
+                is_game_completed=game_session["is_completed"]
+            ))
+        
+        if is_game_completed:
+            await record_completed_game(game_session["player_id"], updated_session["score"])
+        
+        return respond(BatchAnswerResponse(
+            results=results,
+            current_round=update_data["current_round"],
+            score=updated_session["score"],
+            is_game_completed=is_game_completed
+        ))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error submitting answers: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to submit answers")
+
+
 # Get game session status
 @api_router.get("/games/{session_id}", response_model=GameResponse)
 async def get_game_session(session_id: str):
     try:
-        game_session = await db.game_sessions.find_one({"session_id": session_id})
+        game_session = await load_game_session(session_id)
         if not game_session:
             raise HTTPException(status_code=404, detail="Game session not found")
         
         current_round = game_session["current_round"]
-        current_round_data = game_session["rounds_data"][current_round - 1]
+        question, correct_answer, options, _ = session_question(game_session, current_round)
         
-        return GameResponse(
+        return respond(GameResponse(
             session_id=session_id,
             current_round=current_round,
             score=game_session["score"],
-            question=current_round_data["question"],
-            options=[],  # Options will be generated on frontend for now
-            correct_answer=current_round_data["correct_answer"],
+            question=question,
+            options=options,
+            correct_answer=correct_answer,
             is_boss_level=current_round == 10,
             is_completed=game_session["is_completed"]
-        )
+        ))
         
     except HTTPException:
         raise
@@ -222,7 +631,7 @@ async def get_game_session(session_id: str):
 @api_router.get("/players/{player_id}/stats", response_model=PlayerStats)
 async def get_player_stats(player_id: str):
     try:
-        player = await db.players.find_one({"player_id": player_id})
+        player = await stores.players.get(player_id)
         if not player:
             raise HTTPException(status_code=404, detail="Player not found")
         
@@ -236,27 +645,110 @@ async def get_player_stats(player_id: str):
         raise HTTPException(status_code=500, detail="Failed to get player stats")
 
 
+# Get per-operation and per-round skill analytics of a player
+@api_router.get("/players/{player_id}/analytics", response_model=PlayerAnalytics)
+async def get_player_analytics(player_id: str):
+    try:
+        analytics = analytics_cache.get(player_id)
+        if analytics is None:
+            # A game completed while the rounds are read makes them stale
+            generation = analytics_cache.generation(player_id)
+            columns = await stores.games.round_columns(player_id)
+            if not columns and not await stores.players.get(player_id):
+                raise HTTPException(status_code=404, detail="Player not found")
+            
+            analytics = calculate_player_analytics(player_id, columns)
+            analytics_cache.put(player_id, analytics, generation)
+        
+        return PlayerAnalytics(**analytics)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error getting player analytics: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to get player analytics")
+
+
 # Get player by name
 @api_router.get("/players/by-name/{player_name}")
 async def get_player_by_name(player_name: str):
     try:
-        player = await db.players.find_one({"name": player_name})
+        player = await player_names.get(player_name)
         if not player:
             return {"exists": False}
         
-        return {
-            "exists": True,
-            "player_id": player["player_id"],
-            "name": player["name"],
-            "games_played": player.get("games_played", 0),
-            "best_score": player.get("best_score", 0)
-        }
+        return {"exists": True, **player}
         
     except Exception as e:
         logging.error(f"Error getting player by name: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to get player")
 
 
+# Leaderboard: top players plus the rank of one player
+@api_router.get("/leaderboard", response_model=LeaderboardResponse)
+async def get_leaderboard(limit: int = 10, player_id: Optional[str] = None):
+    limit = max(1, min(limit, 100))
+    return LeaderboardResponse(
+        top=leaderboard.top(limit),
+        player=leaderboard.player(player_id) if player_id else None,
+        total_players=len(leaderboard)
+    )
+
+
+# Daily or weekly leaderboard, the current period unless one is given
+@api_router.get("/leaderboard/{window}", response_model=LeaderboardResponse)
+async def get_windowed_leaderboard(window: str, limit: int = 10, player_id: Optional[str] = None,
+                                   period: Optional[str] = None):
+    if window not in WINDOWS:
+        raise HTTPException(status_code=404, detail="Unknown leaderboard window")
+    try:
+        limit = max(1, min(limit, 100))
+        period, top, player, total_players = await windowed_leaderboards.top(window, limit, player_id, period)
+        return LeaderboardResponse(period=period, top=top, player=player, total_players=total_players)
+        
+    except Exception as e:
+        logging.error(f"Error getting {window} leaderboard: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to get leaderboard")
+
+
+# Stream completed game sessions with their rounds for analytics. Pass the
+# X-Export-Watermark header of the previous export as since to only get new ones.
+@api_router.get("/export/sessions")
+async def export_game_sessions(export_format: str = Query("ndjson", alias="format"),
+                               since: Optional[datetime] = None, until: Optional[datetime] = None):
+    if export_format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown export format, use one of {', '.join(FORMATS)}")
+    if export_format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow")
+    
+    since = naive_utc(since)
+    until = export_window(since, until)
+    return StreamingResponse(
+        export_sessions(stores.games, export_format, since, until),
+        media_type=FORMATS[export_format],
+        headers={
+            "X-Export-Watermark": until.isoformat(),
+            "Content-Disposition": f"attachment; filename=game_sessions.{export_format}",
+        }
+    )
+
+
+# Prometheus metrics: per-endpoint latency histograms and sampled span timings
+@api_router.get("/metrics")
+async def get_metrics():
+    return Response(content=tracer.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# Session cache, player name cache and cross-worker sync statistics
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    return {
+        "sessions": session_cache.stats if session_cache else None,
+        "names": player_names.stats,
+        "sync": cache_sync.stats if cache_sync else None,
+    }
+
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -268,6 +760,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so the time spent in the other middleware is included
+app.add_middleware(RequestMetricsMiddleware, tracer=tracer)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -275,6 +770,79 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+# Set on startup, see start_app
+warm_up_task = None
+warm_up_retry_interval = float(os.environ.get('WARM_UP_RETRY_INTERVAL', '2.0'))
+
+
+async def warm_up():
+    """Database work the API needs before it takes traffic, retried until it succeeds"""
+    while True:
+        try:
+            await stores.setup()
+            leaderboard.load(await stores.players.rankings())
+            if question_pool:
+                await asyncio.to_thread(question_pool.fill)
+            return
+        except Exception as e:
+            logging.error(f"Error warming up, retrying: {str(e)}")
+            await asyncio.sleep(warm_up_retry_interval)
+
+
+async def start_app():
+    """
+    Runs in every worker process. The client and stores are created without
+    any I/O; index creation, the leaderboard load and the question pool fill
+    run in the background, and /api/ready reports when they are done.
+    """
+    global client, db, session_archive, warm_up_task
+    # Stores set up beforehand (benchmarks) are kept
+    if stores is None:
+        if storage_backend == 'mongo':
+            client = create_client()
+            db = client[os.environ['DB_NAME']]
+            session_archive = SessionArchive(
+                db,
+                after_days=archive_after_days,
+                batch_size=int(os.environ.get('ARCHIVE_BATCH_SIZE', '500')),
+                interval=float(os.environ.get('ARCHIVE_INTERVAL', '3600'))
+            )
+        elif workers > 1:
+            logging.warning("The memory backend is per process, workers will not see each other's games")
+        use_stores(create_stores(storage_backend, db, archive=session_archive))
+
+    warm_up_task = asyncio.create_task(warm_up())
+    if session_cache:
+        session_cache.start()
+    skill_ratings.start()
+    if session_archive and archive_after_days > 0:
+        if workers > 1:
+            # Workers would archive the same sessions twice
+            logging.warning("The archive job does not run with several workers, schedule `cli.py archive-sessions`")
+        else:
+            session_archive.start()
+    if cache_sync:
+        cache_sync.start()
+
+
+async def wait_until_ready():
+    """For benchmarks and tests that send traffic right after startup"""
+    await asyncio.shield(warm_up_task)
+
+
+async def stop_app():
+    global client, db, stores, warm_up_task
+    if warm_up_task:
+        warm_up_task.cancel()
+        warm_up_task = None
+    if cache_sync:
+        await cache_sync.close()
+    if session_archive:
+        await session_archive.close()
+    if session_cache:
+        await session_cache.close()
+    await skill_ratings.close()
+    if client:
+        client.close()
+        # The next start connects again
+        client = db = stores = None
@@ -0,0 +1,146 @@
+import asyncio
+import copy
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from storage import GameStore, apply_update
+
+
+WRITE_THROUGH = "write-through"
+WRITE_BEHIND = "write-behind"
+
+
+class SessionCache:
+    """
+    Bounded LRU/TTL cache of active game sessions in front of a GameStore.
+    In write-through mode every update is also written to the store before it is
+    acknowledged; in write-behind mode updates are flushed in the background,
+    when a game completes and on shutdown.
+    """
+
+    def __init__(self, store: GameStore, mode: str = WRITE_THROUGH, max_entries: int = 10000,
+                 ttl_seconds: float = 900.0, flush_interval: float = 1.0):
+        if mode not in (WRITE_THROUGH, WRITE_BEHIND):
+            raise ValueError(f"Unknown session cache mode: {mode}")
+        self.store = store
+        self.mode = mode
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.flush_interval = flush_interval
+        self._sessions: "OrderedDict[str, dict]" = OrderedDict()
+        self._expires_at: Dict[str, float] = {}
+        self._dirty: Dict[str, dict] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "flushes": 0,
+            "entries": 0,
+        }
+
+    def _store(self, session: dict) -> None:
+        session_id = session["session_id"]
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        self._expires_at[session_id] = time.monotonic() + self.ttl_seconds
+        while len(self._sessions) > self.max_entries:
+            evicted_id, _ = self._sessions.popitem(last=False)
+            del self._expires_at[evicted_id]
+            self.stats["evictions"] += 1
+        self.stats["entries"] = len(self._sessions)
+
+    def _drop(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+        self._expires_at.pop(session_id, None)
+        self.stats["entries"] = len(self._sessions)
+
+    def put(self, session: dict) -> None:
+        """Cache a session that was just inserted into the database"""
+        self._store({key: value for key, value in session.items() if key != "_id"})
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        session = self._sessions.get(session_id)
+        if session is not None:
+            if self._expires_at[session_id] > time.monotonic():
+                self._sessions.move_to_end(session_id)
+                self.stats["hits"] += 1
+                return session
+            self._drop(session_id)
+            self.stats["expirations"] += 1
+
+        self.stats["misses"] += 1
+        # A session evicted before its write-behind flush is still the newest copy
+        session = self._dirty.get(session_id)
+        if session is None:
+            session = await self.store.get(session_id)
+        if session is not None:
+            self._store(session)
+        return session
+
+    async def update(self, guard: dict, update: dict, flush: bool = False) -> Optional[dict]:
+        """
+        Apply a guarded update to a cached session. Returns the updated session,
+        or None when the guard no longer matches (e.g. a duplicate answer).
+        """
+        session_id = guard["session_id"]
+        session = await self.get(session_id)
+        if session is None or any(session.get(key) != value for key, value in guard.items()):
+            return None
+
+        if self.mode == WRITE_THROUGH:
+            # The cached copy changes only once the store has the update. If the
+            # write fails it is dropped, the next read takes the stored state.
+            try:
+                written = await self.store.update(guard, update)
+            except Exception:
+                self._drop(session_id)
+                raise
+            if not written:
+                # Another writer moved the session on, the cached copy is stale
+                self._drop(session_id)
+                return None
+            apply_update(session, update)
+            return session
+
+        apply_update(session, update)
+        self._dirty[session_id] = session
+        if flush:
+            await self.flush(session_id)
+        return session
+
+    async def flush(self, session_id: Optional[str] = None) -> None:
+        """Write dirty sessions to the database, all of them if no session_id is given"""
+        session_ids = [session_id] if session_id else list(self._dirty)
+        for dirty_id in session_ids:
+            session = self._dirty.pop(dirty_id, None)
+            if session is None:
+                continue
+            try:
+                await self.store.save(copy.deepcopy(session))
+            except Exception:
+                # Keep the newest copy dirty so the next flush retries it
+                self._dirty.setdefault(dirty_id, session)
+                raise
+            self.stats["flushes"] += 1
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Error flushing session cache: {str(e)}")
+
+    def start(self) -> None:
+        if self.mode == WRITE_BEHIND and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
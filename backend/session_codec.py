@@ -0,0 +1,250 @@
+import math
+import struct
+from typing import Dict, List, Optional
+
+from bson import Binary
+
+from game_logic import OPERATIONS
+
+
+# Stored layouts of db.game_sessions. Version 1 (no "v" field) keeps
+# rounds_data as a list of RoundData sub-documents. Version 2 packs the rounds
+# into parallel arrays under "r", or into one binary blob "b" once a session
+# is completed and packed. Round numbers are implicit (array index + 1) and
+# the top-level fields keep their names because they are indexed and queried.
+SCHEMA_VERSION = 2
+
+# RoundData field -> short key of its array in "r"
+ROUND_KEYS = {
+    "operation": "o",
+    "correct_answer": "c",
+    "player_answer": "a",
+    "is_correct": "k",
+    "time_taken": "t",
+    "question": "q",
+    "difficulty": "d",
+}
+# Always present, one entry per round. "q" and "d" exist only for sessions
+# that store questions or difficulties, then also one entry per round.
+REQUIRED_KEYS = ("o", "c", "a", "k", "t")
+
+# operation, correct_answer, player_answer, flags, time_taken in ms, difficulty
+PACKED_ROUND = struct.Struct("<biiBiB")
+ANSWERED, CORRECT = 1, 2
+
+
+def _milliseconds(seconds: float) -> int:
+    """Raises ValueError for times the 64-bit integer fields cannot hold"""
+    if not math.isfinite(seconds) or abs(seconds) * 1000 >= 2**63:
+        raise ValueError(f"time_taken {seconds} out of range")
+    return int(round(seconds * 1000))
+
+
+def _encode_value(field: str, value):
+    if value is None:
+        return None
+    if field == "operation":
+        return OPERATIONS.index(value)
+    if field == "time_taken":
+        # Millisecond resolution as a small int instead of a double
+        return _milliseconds(value)
+    return value
+
+
+def _decode_value(field: str, value):
+    if value is None:
+        return None
+    if field == "operation":
+        return OPERATIONS[value]
+    if field == "time_taken":
+        return value / 1000
+    return value
+
+
+def encode_round(round_data: dict) -> Dict[str, object]:
+    """Short key -> encoded value of one round, "q" and "d" only when set"""
+    encoded = {}
+    for field, key in ROUND_KEYS.items():
+        value = round_data.get(field)
+        if key in REQUIRED_KEYS or value is not None:
+            encoded[key] = _encode_value(field, value)
+    return encoded
+
+
+def decode_rounds(rounds: dict) -> List[dict]:
+    decoded = []
+    for index in range(len(rounds["o"])):
+        round_data = {"round_number": index + 1}
+        for field, key in ROUND_KEYS.items():
+            values = rounds.get(key)
+            round_data[field] = _decode_value(field, values[index]) if values else None
+        decoded.append(round_data)
+    return decoded
+
+
+def pack_rounds(rounds_data: List[dict]) -> bytes:
+    """
+    Binary form of the rounds of a completed session, questions stay out of it.
+    Raises ValueError for answers or times outside the packed ranges.
+    """
+    packed = bytearray()
+    for round_data in rounds_data:
+        flags = (ANSWERED if round_data.get("is_correct") is not None else 0) | \
+                (CORRECT if round_data.get("is_correct") else 0)
+        time_taken = round_data.get("time_taken")
+        time_ms = -1 if time_taken is None else _milliseconds(time_taken)
+        if time_ms < -1:
+            raise ValueError(f"time_taken {time_taken} out of range")
+        try:
+            packed += PACKED_ROUND.pack(
+                OPERATIONS.index(round_data["operation"]),
+                round_data["correct_answer"],
+                round_data.get("player_answer") or 0,
+                flags,
+                time_ms,
+                round_data.get("difficulty") or 0,
+            )
+        except struct.error as e:
+            raise ValueError(f"Round {round_data.get('round_number')} does not fit the packed layout: {e}")
+    return bytes(packed)
+
+
+def unpack_rounds(packed: bytes, questions: Optional[List[str]] = None) -> List[dict]:
+    decoded = []
+    for index, (operation, correct_answer, player_answer, flags, time_ms, difficulty) in \
+            enumerate(PACKED_ROUND.iter_unpack(packed)):
+        answered = bool(flags & ANSWERED)
+        decoded.append({
+            "round_number": index + 1,
+            "question": questions[index] if questions else None,
+            "operation": OPERATIONS[operation],
+            "correct_answer": correct_answer,
+            "player_answer": player_answer if answered else None,
+            "is_correct": bool(flags & CORRECT) if answered else None,
+            "time_taken": None if time_ms < 0 else time_ms / 1000,
+            "difficulty": difficulty or None,
+        })
+    return decoded
+
+
+def encode_session(session: dict, pack: bool = False) -> dict:
+    """
+    Version 2 document of a session. pack=True stores the rounds of a completed
+    session as one binary blob; open sessions always keep the arrays, which
+    answers update in place. Sessions whose rounds do not fit the packed
+    ranges keep the arrays too.
+    """
+    document = {key: value for key, value in session.items() if key not in ("_id", "rounds_data")}
+    document["v"] = SCHEMA_VERSION
+    rounds_data = session.get("rounds_data") or []
+    if pack and session.get("is_completed"):
+        try:
+            document["b"] = Binary(pack_rounds(rounds_data))
+        except ValueError:
+            pass
+        else:
+            questions = [round_data.get("question") for round_data in rounds_data]
+            if any(question is not None for question in questions):
+                document["q"] = questions
+            return document
+
+    rounds = {key: [] for key in REQUIRED_KEYS}
+    for round_data in rounds_data:
+        for key, value in encode_round(round_data).items():
+            rounds.setdefault(key, []).append(value)
+    document["r"] = rounds
+    return document
+
+
+def decode_session(document: Optional[dict]) -> Optional[dict]:
+    """The version 1 layout of a document in either version"""
+    if document is None or "v" not in document:
+        return document
+    session = {key: value for key, value in document.items() if key not in ("v", "r", "b", "q")}
+    if "b" in document:
+        session["rounds_data"] = unpack_rounds(document["b"], document.get("q"))
+    else:
+        session["rounds_data"] = decode_rounds(document["r"])
+    return session
+
+
+def encode_update(update: dict) -> dict:
+    """
+    Translate an update written against the version 1 layout (rounds_data.N.field,
+    rounds_data.N or a $push to rounds_data) into the version 2 arrays
+    """
+    encoded: Dict[str, dict] = {}
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            parts = path.split(".")
+            if parts[0] != "rounds_data":
+                encoded.setdefault(operator, {})[path] = value
+            elif operator == "$push":
+                rounds = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                columns: Dict[str, list] = {}
+                for round_data in rounds:
+                    for key, round_value in encode_round(round_data).items():
+                        columns.setdefault(key, []).append(round_value)
+                for key, values in columns.items():
+                    encoded.setdefault("$push", {})[f"r.{key}"] = {"$each": values}
+            elif len(parts) == 2:
+                # A whole round at index N
+                for key, round_value in encode_round(value).items():
+                    encoded.setdefault(operator, {})[f"r.{key}.{parts[1]}"] = round_value
+            else:
+                field = parts[2]
+                encoded.setdefault(operator, {})[f"r.{ROUND_KEYS[field]}.{parts[1]}"] = \
+                    _encode_value(field, value)
+    return encoded
+
+
+def packed_round_columns(blobs: List[bytes]) -> dict:
+    """
+    Analytics columns of the answered rounds of packed sessions, read from all
+    the blobs at once as a NumPy structured array instead of round by round
+    """
+    import numpy as np
+
+    layout = np.dtype([("operation", "i1"), ("correct_answer", "<i4"), ("player_answer", "<i4"),
+                       ("flags", "u1"), ("time_ms", "<i4"), ("difficulty", "u1")])
+    rounds = np.frombuffer(b"".join(blobs), dtype=layout)
+    # Round numbers restart at 1 in every blob
+    round_numbers = np.concatenate(
+        [np.arange(1, len(blob) // layout.itemsize + 1) for blob in blobs] or [np.empty(0, dtype=np.int64)]
+    )
+    answered = (rounds["flags"] & ANSWERED) != 0
+    time_ms = rounds["time_ms"][answered]
+    return {
+        "operation": rounds["operation"][answered].tolist(),
+        "round_number": round_numbers[answered].tolist(),
+        "is_correct": ((rounds["flags"][answered] & CORRECT) != 0).tolist(),
+        "time_taken": np.where(time_ms < 0, np.nan, time_ms / 1000).tolist(),
+    }
+
+
+def empty_round_columns() -> dict:
+    return {"operation": [], "round_number": [], "is_correct": [], "time_taken": []}
+
+
+def append_round_columns(columns: dict, document: dict) -> None:
+    """Add the answered rounds of a stored session (either version) to analytics columns"""
+    if "v" in document and "b" not in document:
+        rounds = document["r"]
+        for index, is_correct in enumerate(rounds["k"]):
+            if is_correct is None:
+                continue
+            columns["operation"].append(rounds["o"][index])
+            columns["round_number"].append(index + 1)
+            columns["is_correct"].append(is_correct)
+            time_taken = rounds["t"][index]
+            columns["time_taken"].append(None if time_taken is None else time_taken / 1000)
+        return
+
+    for round_data in decode_session(document).get("rounds_data") or []:
+        if round_data.get("is_correct") is None:
+            continue
+        operation = round_data.get("operation")
+        columns["operation"].append(OPERATIONS.index(operation) if operation in OPERATIONS else -1)
+        columns["round_number"].append(round_data["round_number"])
+        columns["is_correct"].append(round_data["is_correct"])
+        columns["time_taken"].append(round_data.get("time_taken"))
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import math
+import random
+from collections import OrderedDict
+from typing import List, Optional, Set, Tuple
+
+from game_logic import OPERATIONS, generate_question
+from storage import PlayerStore
+
+
+BASE_RATING = 1000.0
+# Questions of difficulty tier t (the round ranges of generate_question) are
+# rated like an opponent of QUESTION_RATING_BASE + t * QUESTION_RATING_STEP
+QUESTION_RATING_BASE = 600.0
+QUESTION_RATING_STEP = 100.0
+MAX_REGULAR_TIER = 9
+BOSS_TIER = 10
+
+
+def question_rating(tier: int) -> float:
+    return QUESTION_RATING_BASE + tier * QUESTION_RATING_STEP
+
+
+class SkillRatings:
+    """
+    Elo-style rating per player and operation for adaptive games. Ratings live
+    in memory, are updated in O(1) per answer and written to the player store
+    (field "skill") in the background. At most max_players are kept, least
+    recently used first out; unsaved ratings are flushed before they go.
+    """
+
+    def __init__(self, store: PlayerStore, target_success: float = 0.7, k_factor: float = 32.0,
+                 flush_interval: float = 30.0, max_players: int = 100000):
+        self.store = store
+        self.k_factor = k_factor
+        self.flush_interval = flush_interval
+        self.max_players = max_players
+        # Rating gap that gives the target success probability under Elo
+        self._target_gap = 400.0 * math.log10(target_success / (1.0 - target_success))
+        self._ratings: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._eviction_flush: Optional[asyncio.Task] = None
+        self.stats = {"evictions": 0, "players": 0}
+
+    def is_loaded(self, player_id: str) -> bool:
+        return player_id in self._ratings
+
+    def load(self, player_id: str, skill: Optional[dict]) -> None:
+        """
+        Take the ratings stored in a player document, defaults for new players.
+        Ratings already in memory are newer than any read that raced them and are kept.
+        """
+        if player_id in self._ratings:
+            self._ratings.move_to_end(player_id)
+            return
+        skill = skill or {}
+        self._ratings[player_id] = [float(skill.get(operation, BASE_RATING)) for operation in OPERATIONS]
+        self._evict(keep=player_id)
+        self.stats["players"] = len(self._ratings)
+
+    async def ensure_loaded(self, player_id: str) -> None:
+        if player_id in self._ratings:
+            self._ratings.move_to_end(player_id)
+        else:
+            self.load(player_id, await self.store.get_skill(player_id))
+
+    def _evict(self, keep: str) -> None:
+        """Drop the least recently used saved ratings beyond max_players"""
+        excess = len(self._ratings) - self.max_players
+        if excess <= 0:
+            return
+        evicted = []
+        for player_id in self._ratings:
+            if player_id == keep:
+                continue
+            if player_id in self._dirty:
+                # Evicted on a later load, once the flush started here has saved it
+                self._flush_for_eviction()
+                continue
+            evicted.append(player_id)
+            if len(evicted) == excess:
+                break
+        for player_id in evicted:
+            del self._ratings[player_id]
+        self.stats["evictions"] += len(evicted)
+
+    def _flush_for_eviction(self) -> None:
+        if self._eviction_flush is None:
+            self._eviction_flush = asyncio.create_task(self._flush_in_background())
+
+    async def _flush_in_background(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            logging.error(f"Error saving skill ratings: {str(e)}")
+        finally:
+            self._eviction_flush = None
+
+    def forget(self, player_id: str) -> None:
+        """Drop saved ratings so the next use reloads them from the store"""
+        if player_id not in self._dirty:
+            self._ratings.pop(player_id, None)
+
+    def record(self, player_id: str, operation: str, tier: int, is_correct: bool) -> float:
+        """Update the rating for one answer, returns the change so it can be reverted"""
+        ratings = self._ratings[player_id]
+        self._ratings.move_to_end(player_id)
+        index = OPERATIONS.index(operation)
+        expected = 1.0 / (1.0 + 10.0 ** ((question_rating(tier) - ratings[index]) / 400.0))
+        change = self.k_factor * ((1.0 if is_correct else 0.0) - expected)
+        ratings[index] += change
+        self._dirty.add(player_id)
+        return change
+
+    def revert(self, player_id: str, operation: str, change: float) -> None:
+        ratings = self._ratings.get(player_id)
+        # A flush may have saved the change meanwhile, and then evicted the
+        # player; the change is only lost in that case
+        if ratings is not None:
+            ratings[OPERATIONS.index(operation)] -= change
+            self._dirty.add(player_id)
+
+    def pick_tier(self, player_id: str, operation: str) -> int:
+        """Difficulty tier whose expected success rate is closest to the target"""
+        rating = self._ratings[player_id][OPERATIONS.index(operation)]
+        tier = round((rating - self._target_gap - QUESTION_RATING_BASE) / QUESTION_RATING_STEP)
+        return max(1, min(tier, MAX_REGULAR_TIER))
+
+    def next_question(self, player_id: str, round_number: int) -> Tuple[Tuple[str, int, List[int], str], int]:
+        """Returns (question tuple as from generate_question, difficulty tier)"""
+        operation = OPERATIONS[random.randint(0, 3)]
+        # The boss round keeps its own rules
+        tier = BOSS_TIER if round_number == 10 else self.pick_tier(player_id, operation)
+        return generate_question(tier, operation=operation), tier
+
+    async def flush(self) -> None:
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        try:
+            await self.store.save_skills({
+                player_id: dict(zip(OPERATIONS, self._ratings[player_id])) for player_id in dirty
+            })
+        except Exception:
+            self._dirty |= dirty
+            raise
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Error saving skill ratings: {str(e)}")
+
+    def start(self) -> None:
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._eviction_flush is not None:
+            self._eviction_flush.cancel()
+            self._eviction_flush = None
+        await self.flush()
@@ -0,0 +1,76 @@
+import asyncio
+import json
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+
+def parse_importtime(output: str) -> List[Tuple[str, float]]:
+    """
+    Self time per top-level package in milliseconds from the output of
+    `python -X importtime`, slowest first
+    """
+    totals: Dict[str, float] = defaultdict(float)
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us) / 1000
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+async def _get(app, path: str) -> int:
+    """One GET through the ASGI interface, without an HTTP client to import"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"profile")], "client": ("127.0.0.1", 0), "server": ("profile", 80),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]["status"]
+
+
+def main(launched_at: float, ready_timeout: float) -> None:
+    """
+    Cold start phases of the API in this fresh process, printed as JSON. Run by
+    `cli.py profile-startup`; only the standard library is imported up to here,
+    so the server's imports are the ones measured. Exits with 1 when the API is
+    not ready within ready_timeout seconds, "ready" is null then.
+    """
+    phases = {"interpreter": time.time() - launched_at}
+    start = time.perf_counter()
+    import server
+    phases["import"] = time.perf_counter() - start
+
+    async def run():
+        start = time.perf_counter()
+        await server.start_app()
+        phases["startup"] = time.perf_counter() - start
+        status = await _get(server.app, "/api/")
+        phases["first_request"] = time.perf_counter() - start - phases["startup"]
+        try:
+            await asyncio.wait_for(server.wait_until_ready(), ready_timeout)
+            phases["ready"] = time.perf_counter() - start
+        except asyncio.TimeoutError:
+            phases["ready"] = None
+        phases["ready_status"] = await _get(server.app, "/api/ready")
+        phases["first_request_status"] = status
+        await server.stop_app()
+
+    asyncio.run(run())
+    print(json.dumps(phases))
+    if phases["ready"] is None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]), float(sys.argv[2]))
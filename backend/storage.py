@@ -0,0 +1,610 @@
+import asyncio
+import copy
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from pymongo import DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from analytics import round_columns_pipeline
+from archive import SessionArchive
+from game_logic import build_player_stats_update
+from indexes import ensure_indexes
+from session_codec import (
+    SCHEMA_VERSION, append_round_columns, decode_session, empty_round_columns, encode_session, encode_update,
+    packed_round_columns
+)
+
+
+def _get_field(target, key):
+    if isinstance(target, list):
+        return target[int(key)]
+    if isinstance(target, dict):
+        return target.get(key)
+    return getattr(target, key)
+
+
+def _set_field(target, key, value):
+    if isinstance(target, dict):
+        target[key] = value
+    else:
+        setattr(target, key, value)
+
+
+def apply_update(document, update: dict) -> None:
+    """
+    Apply the $set/$setOnInsert/$inc/$max/$push operators of a MongoDB update in
+    place, to a dict or a __slots__ record
+    """
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            *parents, key = path.split(".")
+            target = document
+            for part in parents:
+                target = _get_field(target, part)
+
+            if isinstance(target, list):
+                index = int(key)
+                if operator == "$inc":
+                    target[index] += value
+                elif index == len(target):
+                    target.append(value)
+                else:
+                    target[index] = value
+            elif operator == "$inc":
+                _set_field(target, key, (_get_field(target, key) or 0) + value)
+            elif operator == "$max":
+                current = _get_field(target, key)
+                _set_field(target, key, value if current is None else max(current, value))
+            elif operator in ("$set", "$setOnInsert"):
+                _set_field(target, key, value)
+            elif operator == "$push":
+                values = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                if _get_field(target, key) is None:
+                    _set_field(target, key, [])
+                _get_field(target, key).extend(values)
+            else:
+                raise ValueError(f"Unsupported update operator: {operator}")
+
+
+class GameStore(ABC):
+    """Storage of game sessions, as plain documents"""
+
+    @abstractmethod
+    async def insert(self, session: dict) -> None:
+        ...
+
+    @abstractmethod
+    async def insert_many(self, sessions: List[dict]) -> None:
+        """Bulk load, unordered"""
+
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def update(self, guard: dict, update: dict) -> Optional[dict]:
+        """
+        Apply a MongoDB-style update to the session matching every field of guard.
+        Returns the updated session (at least its score) or None if nothing matched.
+        """
+
+    @abstractmethod
+    async def save(self, session: dict) -> None:
+        """Overwrite the stored fields of a session, e.g. a write-behind flush"""
+
+    @abstractmethod
+    async def round_columns(self, player_id: str) -> Optional[dict]:
+        """
+        Every answered round of a player as parallel arrays: operation (index in
+        OPERATIONS), round_number, is_correct and time_taken
+        """
+
+    @abstractmethod
+    def completed_sessions(self, since: Optional[datetime], until: datetime,
+                           batch_size: int = 1000) -> AsyncIterator[dict]:
+        """Sessions completed in (since, until], streamed batch_size at a time"""
+
+
+class PlayerStore(ABC):
+    """Storage of players and their statistics"""
+
+    @abstractmethod
+    async def get(self, player_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def get_by_name(self, name: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def insert(self, player: dict) -> None:
+        """Raises DuplicateKeyError when the name is taken"""
+
+    @abstractmethod
+    async def get_or_create(self, player: dict) -> dict:
+        """
+        The player with the name of the given one, inserted first when there is
+        none, in one atomic step. The caller can tell the two apart by player_id.
+        """
+
+    @abstractmethod
+    async def insert_many(self, players: List[dict]) -> None:
+        """Bulk load, unordered"""
+
+    @abstractmethod
+    async def record_game(self, player_id: str, score: int) -> Optional[dict]:
+        """Fold a completed game into the statistics, returns name, games_played, best_score and total_score"""
+
+    @abstractmethod
+    async def rankings(self) -> List[dict]:
+        """player_id, name, best_score and total_score of every player"""
+
+    @abstractmethod
+    async def changed_since(self, since: datetime) -> List[dict]:
+        """Like rankings plus games_played, for the players created or last played after since"""
+
+    @abstractmethod
+    async def get_skill(self, player_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def save_skills(self, skills: Dict[str, dict]) -> None:
+        ...
+
+
+class RollupStore(ABC):
+    """Per-window leaderboard rollups, one per (window, period, player)"""
+
+    @abstractmethod
+    async def record(self, periods: List[Tuple[str, str]], player_id: str, name: str, score: int) -> None:
+        """Fold a completed game into the rollup of each (window, period)"""
+
+    @abstractmethod
+    async def list(self, window: str, period: str) -> List[dict]:
+        ...
+
+    @abstractmethod
+    async def top(self, window: str, period: str, limit: int) -> List[dict]:
+        ...
+
+    @abstractmethod
+    async def find(self, window: str, period: str, player_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def find_many(self, window: str, period: str, player_ids: List[str]) -> List[dict]:
+        ...
+
+    @abstractmethod
+    async def count_ahead(self, window: str, period: str, best_score: int, total_score: int) -> int:
+        ...
+
+    @abstractmethod
+    async def count(self, window: str, period: str) -> int:
+        ...
+
+
+RANKING_FIELDS = {"_id": 0, "player_id": 1, "name": 1, "best_score": 1, "total_score": 1}
+
+
+class MongoGameStore(GameStore):
+    """
+    Sessions are written in the compact layout of session_codec and read back
+    in either layout, so documents written before it keep working. Sessions
+    moved to the archive are still found, after a miss on the hot collection.
+    """
+
+    def __init__(self, db, archive: SessionArchive):
+        self.collection = db.game_sessions
+        self.archive = archive
+
+    async def insert(self, session: dict) -> None:
+        await self.collection.insert_one(encode_session(session))
+
+    async def insert_many(self, sessions: List[dict]) -> None:
+        if sessions:
+            await self.collection.insert_many([encode_session(session) for session in sessions], ordered=False)
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        session = await self.collection.find_one({"session_id": session_id}, {"_id": 0})
+        if session is None:
+            return await self.archive.get(session_id)
+        return decode_session(session)
+
+    async def update(self, guard: dict, update: dict) -> Optional[dict]:
+        updated = await self.collection.find_one_and_update(
+            {**guard, "v": SCHEMA_VERSION},
+            encode_update(update),
+            projection={"_id": 0, "score": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated is None:
+            # Not migrated yet (or the guard no longer matches)
+            updated = await self.collection.find_one_and_update(
+                {**guard, "v": {"$exists": False}},
+                update,
+                projection={"_id": 0, "score": 1},
+                return_document=ReturnDocument.AFTER
+            )
+        return updated
+
+    async def save(self, session: dict) -> None:
+        await self.collection.update_one(
+            {"session_id": session["session_id"]},
+            {"$set": encode_session(session), "$unset": {"rounds_data": ""}}
+        )
+
+    async def round_columns(self, player_id: str) -> Optional[dict]:
+        aggregated = await self.collection.aggregate(round_columns_pipeline(player_id)).to_list(1)
+        columns = aggregated[0] if aggregated else empty_round_columns()
+        columns.pop("_id", None)
+        # Packed rounds are a binary blob the aggregation cannot read, they are
+        # unpacked together off the event loop
+        blobs = [
+            bytes(document["b"]) async for document in self.collection.find(
+                {"player_id": player_id, "b": {"$exists": True}}, {"_id": 0, "b": 1}
+            )
+        ]
+        if blobs:
+            packed_columns = await asyncio.to_thread(packed_round_columns, blobs)
+            for name, values in packed_columns.items():
+                columns[name].extend(values)
+        await self.archive.append_round_columns(columns, player_id)
+        return columns if columns["is_correct"] else None
+
+    async def completed_sessions(self, since: Optional[datetime], until: datetime,
+                                 batch_size: int = 1000) -> AsyncIterator[dict]:
+        # Hot sessions first: one archived while the cursor runs is then found in
+        # the archive afterwards (at worst twice) instead of being missed
+        completed_at = {"$lte": until}
+        if since is not None:
+            completed_at["$gt"] = since
+        cursor = self.collection.find(
+            {"is_completed": True, "completed_at": completed_at}, {"_id": 0}
+        ).sort("completed_at", 1).batch_size(batch_size)
+        async for document in cursor:
+            yield decode_session(document)
+        async for session in self.archive.completed_sessions(since, until):
+            yield session
+
+
+class MongoPlayerStore(PlayerStore):
+    def __init__(self, db):
+        self.collection = db.players
+
+    async def get(self, player_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"player_id": player_id}, {"_id": 0})
+
+    async def get_by_name(self, name: str) -> Optional[dict]:
+        return await self.collection.find_one({"name": name}, {"_id": 0})
+
+    async def insert(self, player: dict) -> None:
+        await self.collection.insert_one(dict(player))
+
+    async def get_or_create(self, player: dict) -> dict:
+        new_fields = {key: value for key, value in player.items() if key != "name"}
+        try:
+            return await self._upsert_by_name(player["name"], new_fields)
+        except DuplicateKeyError:
+            # Two upserts of a new name can both miss and insert, the unique
+            # name index rejects the second one, which then finds the first
+            return await self._upsert_by_name(player["name"], new_fields)
+
+    async def _upsert_by_name(self, name: str, new_fields: dict) -> dict:
+        return await self.collection.find_one_and_update(
+            {"name": name},
+            {"$setOnInsert": new_fields},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def insert_many(self, players: List[dict]) -> None:
+        if players:
+            await self.collection.insert_many([dict(player) for player in players], ordered=False)
+
+    async def record_game(self, player_id: str, score: int) -> Optional[dict]:
+        return await self.collection.find_one_and_update(
+            {"player_id": player_id},
+            build_player_stats_update(score),
+            projection={"_id": 0, "name": 1, "games_played": 1, "best_score": 1, "total_score": 1},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def rankings(self) -> List[dict]:
+        return await self.collection.find({}, RANKING_FIELDS).to_list(None)
+
+    async def changed_since(self, since: datetime) -> List[dict]:
+        return await self.collection.find(
+            {"$or": [{"last_played": {"$gt": since}}, {"created_at": {"$gt": since}}]},
+            {**RANKING_FIELDS, "games_played": 1}
+        ).to_list(None)
+
+    async def get_skill(self, player_id: str) -> Optional[dict]:
+        player = await self.collection.find_one({"player_id": player_id}, {"_id": 0, "skill": 1})
+        return player.get("skill") if player else None
+
+    async def save_skills(self, skills: Dict[str, dict]) -> None:
+        await self.collection.bulk_write([
+            UpdateOne({"player_id": player_id}, {"$set": {"skill": skill}})
+            for player_id, skill in skills.items()
+        ], ordered=False)
+
+
+class MongoRollupStore(RollupStore):
+    def __init__(self, db):
+        self.collection = db.leaderboard_rollups
+
+    async def record(self, periods: List[Tuple[str, str]], player_id: str, name: str, score: int) -> None:
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"window": window, "period": period, "player_id": player_id},
+                {
+                    "$setOnInsert": {"name": name},
+                    "$max": {"best_score": score},
+                    "$inc": {"total_score": score, "games_played": 1}
+                },
+                upsert=True
+            )
+            for window, period in periods
+        ], ordered=False)
+
+    async def list(self, window: str, period: str) -> List[dict]:
+        return await self.collection.find({"window": window, "period": period}, RANKING_FIELDS).to_list(None)
+
+    async def top(self, window: str, period: str, limit: int) -> List[dict]:
+        return await self.collection.find(
+            {"window": window, "period": period}, RANKING_FIELDS
+        ).sort([("best_score", DESCENDING), ("total_score", DESCENDING)]).limit(limit).to_list(limit)
+
+    async def find(self, window: str, period: str, player_id: str) -> Optional[dict]:
+        return await self.collection.find_one(
+            {"window": window, "period": period, "player_id": player_id}, RANKING_FIELDS
+        )
+
+    async def find_many(self, window: str, period: str, player_ids: List[str]) -> List[dict]:
+        return await self.collection.find(
+            {"window": window, "period": period, "player_id": {"$in": player_ids}}, RANKING_FIELDS
+        ).to_list(None)
+
+    async def count_ahead(self, window: str, period: str, best_score: int, total_score: int) -> int:
+        return await self.collection.count_documents({"window": window, "period": period, "$or": [
+            {"best_score": {"$gt": best_score}},
+            {"best_score": best_score, "total_score": {"$gt": total_score}},
+        ]})
+
+    async def count(self, window: str, period: str) -> int:
+        return await self.collection.count_documents({"window": window, "period": period})
+
+
+class SessionRecord:
+    __slots__ = ("session_id", "player_id", "current_round", "score", "started_at", "completed_at",
+                 "is_completed", "seed", "adaptive", "rounds_data")
+
+    def __init__(self, document: dict):
+        for field in self.__slots__:
+            setattr(self, field, document.get(field))
+        self.rounds_data = [dict(round_data) for round_data in document.get("rounds_data") or []]
+
+    def to_document(self) -> dict:
+        document = {field: getattr(self, field) for field in self.__slots__}
+        document["rounds_data"] = [dict(round_data) for round_data in self.rounds_data]
+        return document
+
+
+class PlayerRecord:
+    __slots__ = ("player_id", "name", "games_played", "total_score", "best_score",
+                 "boss_levels_completed", "perfect_games", "created_at", "last_played", "skill")
+
+    def __init__(self, document: dict):
+        for field in self.__slots__:
+            setattr(self, field, document.get(field))
+
+    def to_document(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class RollupRecord:
+    __slots__ = ("player_id", "name", "best_score", "total_score", "games_played")
+
+    def __init__(self, player_id: str, name: str):
+        self.player_id = player_id
+        self.name = name
+        self.best_score = 0
+        self.total_score = 0
+        self.games_played = 0
+
+    def to_document(self) -> dict:
+        return {"player_id": self.player_id, "name": self.name,
+                "best_score": self.best_score, "total_score": self.total_score}
+
+
+def _matches(record, guard: dict) -> bool:
+    return all(getattr(record, field) == value for field, value in guard.items())
+
+
+class MemoryGameStore(GameStore):
+    """Sessions in a dict keyed by session_id, plus a per-player index"""
+
+    def __init__(self):
+        self._sessions: Dict[str, SessionRecord] = {}
+        self._by_player: Dict[str, List[str]] = {}
+
+    async def insert(self, session: dict) -> None:
+        if session["session_id"] in self._sessions:
+            raise DuplicateKeyError(f"Duplicate session_id: {session['session_id']}")
+        self._sessions[session["session_id"]] = SessionRecord(session)
+        self._by_player.setdefault(session["player_id"], []).append(session["session_id"])
+
+    async def insert_many(self, sessions: List[dict]) -> None:
+        for session in sessions:
+            await self.insert(session)
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        record = self._sessions.get(session_id)
+        return record.to_document() if record else None
+
+    async def update(self, guard: dict, update: dict) -> Optional[dict]:
+        record = self._sessions.get(guard["session_id"])
+        if record is None or not _matches(record, guard):
+            return None
+        # The update's values may be shared with a cached copy of the session
+        apply_update(record, copy.deepcopy(update))
+        return {"score": record.score}
+
+    async def save(self, session: dict) -> None:
+        if session["session_id"] in self._sessions:
+            self._sessions[session["session_id"]] = SessionRecord(session)
+
+    async def round_columns(self, player_id: str) -> Optional[dict]:
+        columns = empty_round_columns()
+        for session_id in self._by_player.get(player_id, []):
+            append_round_columns(columns, {"rounds_data": self._sessions[session_id].rounds_data})
+        return columns if columns["is_correct"] else None
+
+    async def completed_sessions(self, since: Optional[datetime], until: datetime,
+                                 batch_size: int = 1000) -> AsyncIterator[dict]:
+        records = sorted(
+            (record for record in self._sessions.values()
+             if record.is_completed and record.completed_at <= until
+             and (since is None or record.completed_at > since)),
+            key=lambda record: record.completed_at
+        )
+        for index, record in enumerate(records):
+            yield record.to_document()
+            if (index + 1) % batch_size == 0:
+                await asyncio.sleep(0)
+
+
+class MemoryPlayerStore(PlayerStore):
+    """Players in a dict keyed by player_id, plus a unique name index"""
+
+    def __init__(self):
+        self._players: Dict[str, PlayerRecord] = {}
+        self._by_name: Dict[str, str] = {}
+
+    async def get(self, player_id: str) -> Optional[dict]:
+        record = self._players.get(player_id)
+        return record.to_document() if record else None
+
+    async def get_by_name(self, name: str) -> Optional[dict]:
+        player_id = self._by_name.get(name)
+        return self._players[player_id].to_document() if player_id else None
+
+    async def insert(self, player: dict) -> None:
+        if player["name"] in self._by_name or player["player_id"] in self._players:
+            raise DuplicateKeyError(f"Duplicate player: {player['name']}")
+        self._players[player["player_id"]] = PlayerRecord(player)
+        self._by_name[player["name"]] = player["player_id"]
+
+    async def get_or_create(self, player: dict) -> dict:
+        if player["name"] not in self._by_name:
+            await self.insert(player)
+        return await self.get_by_name(player["name"])
+
+    async def insert_many(self, players: List[dict]) -> None:
+        for player in players:
+            await self.insert(player)
+
+    async def record_game(self, player_id: str, score: int) -> Optional[dict]:
+        record = self._players.get(player_id)
+        if record is None:
+            return None
+        apply_update(record, build_player_stats_update(score))
+        return {"name": record.name, "games_played": record.games_played,
+                "best_score": record.best_score, "total_score": record.total_score}
+
+    async def rankings(self) -> List[dict]:
+        return [
+            {"player_id": record.player_id, "name": record.name,
+             "best_score": record.best_score, "total_score": record.total_score}
+            for record in self._players.values()
+        ]
+
+    async def changed_since(self, since: datetime) -> List[dict]:
+        return [
+            {"player_id": record.player_id, "name": record.name, "games_played": record.games_played,
+             "best_score": record.best_score, "total_score": record.total_score}
+            for record in self._players.values()
+            if (record.last_played and record.last_played > since) or (record.created_at and record.created_at > since)
+        ]
+
+    async def get_skill(self, player_id: str) -> Optional[dict]:
+        record = self._players.get(player_id)
+        return record.skill if record else None
+
+    async def save_skills(self, skills: Dict[str, dict]) -> None:
+        for player_id, skill in skills.items():
+            record = self._players.get(player_id)
+            if record is not None:
+                record.skill = skill
+
+
+class MemoryRollupStore(RollupStore):
+    """Rollups in dicts keyed by (window, period), then player_id"""
+
+    def __init__(self):
+        self._rollups: Dict[Tuple[str, str], Dict[str, RollupRecord]] = {}
+
+    async def record(self, periods: List[Tuple[str, str]], player_id: str, name: str, score: int) -> None:
+        for window, period in periods:
+            rollups = self._rollups.setdefault((window, period), {})
+            record = rollups.get(player_id)
+            if record is None:
+                record = rollups[player_id] = RollupRecord(player_id, name)
+            record.best_score = max(record.best_score, score)
+            record.total_score += score
+            record.games_played += 1
+
+    async def list(self, window: str, period: str) -> List[dict]:
+        return [record.to_document() for record in self._rollups.get((window, period), {}).values()]
+
+    async def top(self, window: str, period: str, limit: int) -> List[dict]:
+        records = sorted(self._rollups.get((window, period), {}).values(),
+                         key=lambda record: (-record.best_score, -record.total_score))
+        return [record.to_document() for record in records[:limit]]
+
+    async def find(self, window: str, period: str, player_id: str) -> Optional[dict]:
+        record = self._rollups.get((window, period), {}).get(player_id)
+        return record.to_document() if record else None
+
+    async def find_many(self, window: str, period: str, player_ids: List[str]) -> List[dict]:
+        rollups = self._rollups.get((window, period), {})
+        return [rollups[player_id].to_document() for player_id in player_ids if player_id in rollups]
+
+    async def count_ahead(self, window: str, period: str, best_score: int, total_score: int) -> int:
+        return sum(
+            1 for record in self._rollups.get((window, period), {}).values()
+            if (record.best_score, record.total_score) > (best_score, total_score)
+        )
+
+    async def count(self, window: str, period: str) -> int:
+        return len(self._rollups.get((window, period), {}))
+
+
+class Stores:
+    """The stores the API runs on, selected by STORAGE_BACKEND"""
+
+    def __init__(self, games: GameStore, players: PlayerStore, rollups: RollupStore, db=None,
+                 archive: Optional[SessionArchive] = None):
+        self.games = games
+        self.players = players
+        self.rollups = rollups
+        self.db = db
+        self.archive = archive
+
+    async def setup(self) -> None:
+        if self.db is not None:
+            await ensure_indexes(self.db)
+
+
+def create_stores(backend: str, db=None, archive: Optional[SessionArchive] = None) -> Stores:
+    """archive configures the cold tier of the mongo backend, the memory backend has none"""
+    if backend == "mongo":
+        archive = archive or SessionArchive(db)
+        return Stores(MongoGameStore(db, archive), MongoPlayerStore(db), MongoRollupStore(db), db=db, archive=archive)
+    if backend == "memory":
+        return Stores(MemoryGameStore(), MemoryPlayerStore(), MemoryRollupStore())
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,137 @@
+import asyncio
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+from connection import create_client
+from game_logic import question_for_round
+from models import GameSession, Player
+from storage import create_stores
+
+
+# Accuracy drops by this much per round over the player's skill, the boss
+# round counts double
+ROUND_PENALTY = 0.03
+
+
+def answer_accuracy(skill: float, round_number: int) -> float:
+    penalty = ROUND_PENALTY * (round_number - 1) * (2 if round_number == 10 else 1)
+    return min(max(skill - penalty, 0.02), 0.99)
+
+
+def synthesize(worker_seed: int, first_player: int, players: int, games_per_player: float = 10.0,
+               skill_alpha: float = 5.0, skill_beta: float = 2.0, days: int = 30, batch_size: int = 1000,
+               name_prefix: str = "player") -> Iterator[Tuple[List[dict], List[dict]]]:
+    """
+    Players and completed seeded game sessions in the stored document layout,
+    as (players, sessions) batches of about batch_size sessions. Skills are
+    drawn from Beta(skill_alpha, skill_beta), games per player from
+    Poisson(games_per_player), and questions come from question_for_round like
+    in real seeded games.
+    """
+    rng = np.random.default_rng(worker_seed)
+    seeds = random.Random(worker_seed)
+    now = datetime.utcnow()
+    player_batch: List[dict] = []
+    session_batch: List[dict] = []
+
+    for index in range(first_player, first_player + players):
+        skill = rng.beta(skill_alpha, skill_beta)
+        games = int(rng.poisson(games_per_player))
+        created_at = now - timedelta(seconds=float(rng.uniform(0, days * 86400)))
+        player = {
+            "player_id": str(uuid.UUID(int=seeds.getrandbits(128), version=4)),
+            "name": f"{name_prefix}_{index}",
+            "games_played": games,
+            "total_score": 0,
+            "best_score": 0,
+            "boss_levels_completed": 0,
+            "perfect_games": 0,
+            "created_at": created_at,
+            "last_played": None,
+        }
+
+        starts = sorted(rng.uniform(0, (now - created_at).total_seconds(), games))
+        for offset in starts:
+            seed = seeds.getrandbits(63)
+            started_at = created_at + timedelta(seconds=float(offset))
+            correct = rng.random(10) < [answer_accuracy(skill, round_number) for round_number in range(1, 11)]
+            # Slower on later rounds and when wrong
+            times = np.round(rng.lognormal(np.log(2.0 + np.arange(10) * 0.3), 0.4) * (1 + 0.5 * ~correct), 3)
+            rounds = []
+            for round_number in range(1, 11):
+                _, correct_answer, options, operation = question_for_round(seed, round_number)
+                is_correct = bool(correct[round_number - 1])
+                rounds.append({
+                    "round_number": round_number,
+                    "question": None,
+                    "operation": operation,
+                    "correct_answer": correct_answer,
+                    "player_answer": correct_answer if is_correct else next(
+                        option for option in options if option != correct_answer
+                    ),
+                    "is_correct": is_correct,
+                    "time_taken": float(times[round_number - 1]),
+                    "difficulty": None,
+                })
+            score = int(correct.sum())
+            completed_at = started_at + timedelta(seconds=float(times.sum()))
+            session_batch.append({
+                "session_id": str(uuid.UUID(int=seeds.getrandbits(128), version=4)),
+                "player_id": player["player_id"],
+                "current_round": 10,
+                "score": score,
+                "started_at": started_at,
+                "completed_at": completed_at,
+                "is_completed": True,
+                "seed": seed,
+                "adaptive": False,
+                "rounds_data": rounds,
+            })
+
+            # Same rules as build_player_stats_update
+            player["total_score"] += score
+            player["best_score"] = max(player["best_score"], score)
+            player["perfect_games"] += score == 10
+            player["boss_levels_completed"] += score >= 9
+            player["last_played"] = completed_at
+
+        player_batch.append(player)
+        if len(session_batch) >= batch_size:
+            yield player_batch, session_batch
+            player_batch, session_batch = [], []
+
+    if player_batch:
+        yield player_batch, session_batch
+
+
+def validate_sample(players: List[dict], sessions: List[dict]) -> None:
+    """Fail fast if the synthetic documents drift from the models"""
+    for model, documents in ((Player, players), (GameSession, sessions)):
+        if documents and model(**documents[0]).dict().keys() != documents[0].keys():
+            raise ValueError(f"Synthetic {model.__name__} fields do not match the model")
+
+
+async def write_batches(stores, batches: Iterator[Tuple[List[dict], List[dict]]]) -> Tuple[int, int]:
+    players = sessions = 0
+    for player_batch, session_batch in batches:
+        await stores.players.insert_many(player_batch)
+        await stores.games.insert_many(session_batch)
+        players += len(player_batch)
+        sessions += len(session_batch)
+    return players, sessions
+
+
+def generate_to_mongo(mongo_url: str, db_name: str, chunk: dict) -> Tuple[int, int]:
+    """Worker process entry point: synthesize one chunk of players into MongoDB"""
+    async def run():
+        client = create_client(mongo_url)
+        try:
+            return await write_batches(create_stores("mongo", client[db_name]), synthesize(**chunk))
+        finally:
+            client.close()
+
+    return asyncio.run(run())
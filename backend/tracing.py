@@ -0,0 +1,207 @@
+import inspect
+import random
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from storage import Stores
+
+
+# Upper bounds in seconds, the last bucket is +Inf
+REQUEST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SPAN_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                0.05, 0.1, 0.25, 1.0)
+
+# Spans of the request being handled, None when it is not sampled
+_current_trace: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("current_trace", default=None)
+
+
+class Histogram:
+    """Fixed-bucket histogram, observe is one bisect and three additions"""
+
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, count) pairs as Prometheus expects them"""
+        pairs = []
+        running = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            running += count
+            pairs.append(("+Inf" if bound == float("inf") else repr(bound), running))
+        return pairs
+
+
+class _Span:
+    __slots__ = ("name", "trace", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = _current_trace.get()
+        if self.trace is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.trace is not None:
+            self.trace.append((self.name, time.perf_counter() - self.start))
+        return False
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items())
+
+
+class Tracer:
+    """
+    Per-endpoint latency histograms for every request, plus the time spent in
+    spans (store calls, question generation) of a sampled fraction of the
+    requests. Everything stays in process memory and is rendered in the
+    Prometheus text format.
+    """
+
+    def __init__(self, sample_rate: float = 0.1):
+        self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        self.requests: Dict[Tuple[str, str, str], Histogram] = {}
+        self.spans: Dict[Tuple[str, str], Histogram] = {}
+        self.sampled_requests = 0
+
+    def span(self, name: str) -> _Span:
+        """Context manager timing a block, free when the request is not sampled"""
+        return _Span(name)
+
+    def sample(self) -> bool:
+        return bool(self.sample_rate) and random.random() < self.sample_rate
+
+    def record(self, method: str, route: str, status: int, seconds: float,
+               trace: Optional[List[Tuple[str, float]]]) -> None:
+        key = (method, route, str(status))
+        histogram = self.requests.get(key)
+        if histogram is None:
+            histogram = self.requests[key] = Histogram(REQUEST_BUCKETS)
+        histogram.observe(seconds)
+
+        if trace is not None:
+            self.sampled_requests += 1
+            for name, span_seconds in trace:
+                histogram = self.spans.get((route, name))
+                if histogram is None:
+                    histogram = self.spans[(route, name)] = Histogram(SPAN_BUCKETS)
+                histogram.observe(span_seconds)
+
+    def render(self) -> str:
+        lines = []
+
+        def histogram_lines(metric: str, labels: dict, histogram: Histogram) -> None:
+            for le, count in histogram.cumulative():
+                lines.append(f"{metric}_bucket{{{_labels(**labels, le=le)}}} {count}")
+            lines.append(f"{metric}_sum{{{_labels(**labels)}}} {histogram.total!r}")
+            lines.append(f"{metric}_count{{{_labels(**labels)}}} {histogram.count}")
+
+        lines.append("# HELP http_request_duration_seconds Time to handle a request, per endpoint")
+        lines.append("# TYPE http_request_duration_seconds histogram")
+        for (method, route, status), histogram in sorted(self.requests.items()):
+            histogram_lines("http_request_duration_seconds",
+                            {"method": method, "route": route, "status": status}, histogram)
+
+        lines.append("# HELP trace_span_duration_seconds Time spent in a span, sampled requests only")
+        lines.append("# TYPE trace_span_duration_seconds histogram")
+        for (route, name), histogram in sorted(self.spans.items()):
+            histogram_lines("trace_span_duration_seconds", {"route": route, "span": name}, histogram)
+
+        lines.append("# HELP trace_sampled_requests_total Requests whose spans were recorded")
+        lines.append("# TYPE trace_sampled_requests_total counter")
+        lines.append(f"trace_sampled_requests_total {self.sampled_requests}")
+        lines.append("# HELP trace_sample_rate Fraction of requests whose spans are recorded")
+        lines.append("# TYPE trace_sample_rate gauge")
+        lines.append(f"trace_sample_rate {self.sample_rate!r}")
+        return "\n".join(lines) + "\n"
+
+
+class TracedStore:
+    """
+    Wraps a store so that each of its coroutine methods runs in a span named
+    db.<name>.<method>. Everything else passes through untouched.
+    """
+
+    def __init__(self, store, name: str):
+        self._store = store
+        self._name = name
+
+    def __getattr__(self, attribute: str):
+        value = getattr(self._store, attribute)
+        if not inspect.iscoroutinefunction(value):
+            return value
+        span_name = f"db.{self._name}.{attribute}"
+
+        async def traced(*args, **kwargs):
+            if _current_trace.get() is None:
+                return await value(*args, **kwargs)
+            with _Span(span_name):
+                return await value(*args, **kwargs)
+
+        # Cached on the instance so __getattr__ runs once per method
+        setattr(self, attribute, traced)
+        return traced
+
+
+def trace_stores(stores: Stores) -> Stores:
+    return Stores(
+        TracedStore(stores.games, "games"),
+        TracedStore(stores.players, "players"),
+        TracedStore(stores.rollups, "rollups"),
+        db=stores.db,
+        archive=stores.archive
+    )
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request. Requests are labelled with the
+    route template, not the path, so session ids do not multiply the series.
+    """
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        trace = [] if self.tracer.sample() else None
+        token = _current_trace.set(trace)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            seconds = time.perf_counter() - start
+            _current_trace.reset(token)
+            route = scope.get("route")
+            self.tracer.record(scope["method"], getattr(route, "path", "unmatched"), status, seconds, trace)
@@ -8,7 +8,8 @@ import requests
 import json
 import time
 import os
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
 # Get backend URL from frontend .env file
 def get_backend_url():
@@ -38,7 +39,12 @@ test_results = {
     "submit_answer": False,
     "get_game_session": False,
     "player_stats": False,
-    "player_lookup": False
+    "player_lookup": False,
+    "concurrent_answers": False,
+    "parallel_completion": False,
+    "batch_answers_retry": False,
+    "concurrent_first_games": False,
+    "export_watermark_clamped": False
 }
 
 errors = []
@@ -322,6 +328,196 @@ if session_id and current_round == 10:
     else:
         print("    ❌ Failed to get boss level question")
 
+# Test 9: Concurrent Duplicate Answers
+print("\n9. Testing Concurrent Duplicate Answers")
+print("-" * 40)
+response = make_request("POST", f"{API_BASE}/games", json={"player_name": player_name + "_race"})
+if response and response.status_code == 200:
+    race_data = response.json()
+    race_session_id = race_data["session_id"]
+    duplicate_answer = {
+        "player_answer": race_data["correct_answer"],
+        "time_taken": 1.0,
+        "round_number": 1
+    }
+    
+    # Fire the same answer for round 1 many times at once
+    with ThreadPoolExecutor(max_workers=20) as executor:
+        responses = list(executor.map(
+            lambda _: make_request("POST", f"{API_BASE}/games/{race_session_id}/answer", json=duplicate_answer),
+            range(20)
+        ))
+    
+    status_codes = [r.status_code if r else None for r in responses]
+    accepted = status_codes.count(200)
+    rejected = status_codes.count(409)
+    
+    game_response = make_request("GET", f"{API_BASE}/games/{race_session_id}")
+    race_state = game_response.json() if game_response and game_response.status_code == 200 else {}
+    
+    if accepted == 1 and rejected == 19 and race_state.get("score") == 1 and race_state.get("current_round") == 2:
+        log_test("concurrent_answers", True, f"1 of 20 duplicate answers scored, {rejected} rejected with 409")
+    else:
+        log_test("concurrent_answers", False, f"Status codes: {status_codes}, session state: {race_state}")
+else:
+    status_code = response.status_code if response else "No response"
+    log_test("concurrent_answers", False, f"Failed to start race game: {status_code}")
+
+# Test 10: Parallel Game Completion
+print("\n10. Testing Parallel Game Completion Stats")
+print("-" * 40)
+
+def play_full_game(game_data):
+    """Answer every round correctly and return the final score"""
+    answer = game_data["correct_answer"]
+    final_score = None
+    for _ in range(10):
+        answer_response = make_request("POST", f"{API_BASE}/games/{game_data['session_id']}/answer",
+                                       json={"player_answer": answer, "time_taken": 1.0})
+        if not answer_response or answer_response.status_code != 200:
+            return None
+        answer_data = answer_response.json()
+        answer = answer_data.get("next_correct_answer")
+        final_score = answer_data["score"]
+    return final_score
+
+parallel_name = player_name + "_parallel"
+parallel_games = []
+for _ in range(5):
+    response = make_request("POST", f"{API_BASE}/games", json={"player_name": parallel_name})
+    if response and response.status_code == 200:
+        parallel_games.append(response.json())
+
+if len(parallel_games) == 5:
+    # Finish all games for the same player at the same time
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        final_scores = list(executor.map(play_full_game, parallel_games))
+    
+    lookup = make_request("GET", f"{API_BASE}/players/by-name/{parallel_name}")
+    parallel_player_id = lookup.json().get("player_id") if lookup and lookup.status_code == 200 else None
+    stats_response = make_request("GET", f"{API_BASE}/players/{parallel_player_id}/stats") if parallel_player_id else None
+    stats = stats_response.json() if stats_response and stats_response.status_code == 200 else {}
+    
+    if (None not in final_scores and
+        stats.get("games_played") == 5 and
+        stats.get("total_score") == sum(final_scores) and
+        stats.get("best_score") == max(final_scores) and
+        stats.get("perfect_games") == final_scores.count(10)):
+        log_test("parallel_completion", True, f"5 parallel games counted exactly: {stats}")
+    else:
+        log_test("parallel_completion", False, f"Scores {final_scores} do not match stats {stats}")
+else:
+    log_test("parallel_completion", False, f"Only started {len(parallel_games)} of 5 games")
+
+# Test 11: Idempotent Batch Answers
+print("\n11. Testing Batch Answer Retries")
+print("-" * 40)
+response = make_request("POST", f"{API_BASE}/games", json={"player_name": player_name + "_batch", "prefetch": True})
+if response and response.status_code == 200 and response.json().get("questions"):
+    batch_game = response.json()
+    batch_answers = {"answers": [
+        {"player_answer": question["correct_answer"], "time_taken": 1.0, "round_number": question["round_number"]}
+        for question in batch_game["questions"]
+    ]}
+    
+    # Submit the whole game twice, as a client retrying after a timeout would
+    first = make_request("POST", f"{API_BASE}/games/{batch_game['session_id']}/answers", json=batch_answers)
+    retry = make_request("POST", f"{API_BASE}/games/{batch_game['session_id']}/answers", json=batch_answers)
+    
+    lookup = make_request("GET", f"{API_BASE}/players/by-name/{player_name}_batch")
+    batch_player = lookup.json() if lookup and lookup.status_code == 200 else {}
+    
+    if (first and retry and first.status_code == 200 and retry.status_code == 200 and
+        first.json()["score"] == 10 and retry.json() == first.json() and
+        batch_player.get("games_played") == 1):
+        log_test("batch_answers_retry", True, "Retried batch returned the same results and was scored once")
+    else:
+        log_test("batch_answers_retry", False, f"First: {first.json() if first else None}, retry: {retry.json() if retry else None}, player: {batch_player}")
+else:
+    status_code = response.status_code if response else "No response"
+    log_test("batch_answers_retry", False, f"Failed to start prefetched game: {status_code}")
+
+# Test 12: Concurrent First Games for One Name
+print("\n12. Testing Concurrent First Games for One Name")
+print("-" * 40)
+first_name = player_name + "_first"
+leaderboard_response = make_request("GET", f"{API_BASE}/leaderboard", params={"limit": 1})
+players_before = leaderboard_response.json()["total_players"] if leaderboard_response and leaderboard_response.status_code == 200 else None
+
+# Start hundreds of games at once for a name nobody has played under yet
+with ThreadPoolExecutor(max_workers=50) as executor:
+    responses = list(executor.map(
+        lambda _: make_request("POST", f"{API_BASE}/games", json={"player_name": first_name}),
+        range(200)
+    ))
+
+status_codes = [r.status_code if r else None for r in responses]
+leaderboard_response = make_request("GET", f"{API_BASE}/leaderboard", params={"limit": 1})
+players_after = leaderboard_response.json()["total_players"] if leaderboard_response and leaderboard_response.status_code == 200 else None
+lookup = make_request("GET", f"{API_BASE}/players/by-name/{first_name}")
+first_player = lookup.json() if lookup and lookup.status_code == 200 else {}
+
+# Count the player documents directly when the database is reachable from here
+player_documents = None
+if os.environ.get("MONGO_URL") and os.environ.get("DB_NAME"):
+    try:
+        from pymongo import MongoClient
+        mongo_client = MongoClient(os.environ["MONGO_URL"], serverSelectionTimeoutMS=5000)
+        player_documents = mongo_client[os.environ["DB_NAME"]].players.count_documents({"name": first_name})
+        mongo_client.close()
+    except Exception as e:
+        print(f"    ⚠️  Could not count player documents: {e}")
+
+if (status_codes.count(200) == 200 and first_player.get("exists") and
+    players_before is not None and players_after == players_before + 1 and
+    player_documents in (None, 1)):
+    documents = f", {player_documents} player document" if player_documents is not None else ""
+    log_test("concurrent_first_games", True, f"200 simultaneous first games created one player{documents}")
+else:
+    log_test("concurrent_first_games", False,
+             f"Status codes: {sorted(set(status_codes), key=str)}, players {players_before} -> {players_after}, "
+             f"player documents: {player_documents}, lookup: {first_player}")
+
+# Test 13: Export Watermark Clamped
+print("\n13. Testing Export Watermark Clamp")
+print("-" * 40)
+# A watermark in the future would make the next incremental export skip
+# every session completed before it
+export_since = (datetime.utcnow() - timedelta(hours=1)).isoformat()
+response = make_request("GET", f"{API_BASE}/export/sessions",
+                        params={"format": "csv", "since": export_since, "until": "2100-01-01T00:00:00"})
+if response and response.status_code == 200 and "X-Export-Watermark" in response.headers:
+    watermark = datetime.fromisoformat(response.headers["X-Export-Watermark"])
+    if watermark <= datetime.utcnow():
+        log_test("export_watermark_clamped", True, f"Future until clamped to watermark {watermark.isoformat()}")
+    else:
+        log_test("export_watermark_clamped", False, f"Watermark {watermark.isoformat()} is in the future")
+else:
+    status_code = response.status_code if response else "No response"
+    log_test("export_watermark_clamped", False, f"Export failed: {status_code}")
+
+# Test 14: Answers for Rounds Not Reached
+print("\n14. Testing Answers for Rounds Not Reached")
+print("-" * 40)
+response = make_request("POST", f"{API_BASE}/games", json={"player_name": player_name + "_ahead", "prefetch": True})
+if response and response.status_code == 200:
+    ahead_game = response.json()
+    ahead_answer = {"player_answer": 0, "time_taken": 1.0, "round_number": 3}
+    single = make_request("POST", f"{API_BASE}/games/{ahead_game['session_id']}/answer", json=ahead_answer)
+    batch = make_request("POST", f"{API_BASE}/games/{ahead_game['session_id']}/answers",
+                         json={"answers": [ahead_answer]})
+    details = [r.json().get("detail") if r is not None and r.status_code == 409 else None for r in (single, batch)]
+
+    if details == ["Round not reached", "Round not reached"]:
+        log_test("round_not_reached", True, "Answers for round 3 of a new game rejected as not reached")
+    else:
+        log_test("round_not_reached", False,
+                 f"Single: {single.status_code if single else None} {details[0]}, "
+                 f"batch: {batch.status_code if batch else None} {details[1]}")
+else:
+    status_code = response.status_code if response else "No response"
+    log_test("round_not_reached", False, f"Failed to start game: {status_code}")
+
 # Summary
 print("\n" + "=" * 60)
 print("BACKEND API TEST SUMMARY")